@@ -0,0 +1,97 @@
+"""
+Reading source images straight from ZIP, CBZ and TAR archives.
+
+An ImageItem can name a member inside an archive instead of a plain file.
+Each process keeps one open handle per archive, and members are read
+through it on demand: the compressed member data is loaded into memory
+and decoded from there, so nothing is ever extracted to disk. Handles
+are reopened when the archive file changes.
+"""
+
+import hashlib
+import io
+import os
+import tarfile
+import threading
+import zipfile
+from typing import Dict, List, Tuple, Union
+
+
+# Archive types by extension
+ZIP_EXTENSIONS = ('.zip', '.cbz')
+TAR_EXTENSIONS = ('.tar', '.cbt')
+
+# Members that are offered as images, by extension
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tif', '.tiff', '.webp')
+
+_Archive = Union[zipfile.ZipFile, tarfile.TarFile]
+
+# (path, process id) -> (file stat, archive, lock); worker processes open
+# their own handles, because a forked handle shares its file position
+_handles: Dict[Tuple[str, int], Tuple[Tuple[int, int], _Archive, threading.Lock]] = {}
+_handles_lock = threading.Lock()
+
+
+def is_archive(file_path: str) -> bool:
+    """Check whether a file is a supported archive, by its extension."""
+    extension = os.path.splitext(file_path)[1].lower()
+    return extension in ZIP_EXTENSIONS or extension in TAR_EXTENSIONS
+
+
+def _open_archive(file_path: str) -> Tuple[_Archive, threading.Lock]:
+    """Return the shared handle of an archive, opening it if needed."""
+    path = os.path.abspath(file_path)
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    key = (path, os.getpid())
+    with _handles_lock:
+        entry = _handles.get(key)
+        if entry is not None and entry[0] == signature:
+            return entry[1], entry[2]
+        if entry is not None:
+            entry[1].close()
+        if os.path.splitext(path)[1].lower() in ZIP_EXTENSIONS:
+            archive = zipfile.ZipFile(path)
+        else:
+            archive = tarfile.open(path)
+        _handles[key] = (signature, archive, threading.Lock())
+        return archive, _handles[key][2]
+
+
+def list_images(file_path: str) -> List[str]:
+    """
+    List the image members of an archive.
+    
+    Returns:
+        Member names, sorted by name (the page order of comic archives)
+    """
+    archive, lock = _open_archive(file_path)
+    with lock:
+        if isinstance(archive, zipfile.ZipFile):
+            names = [info.filename for info in archive.infolist() if not info.is_dir()]
+        else:
+            names = [info.name for info in archive.getmembers() if info.isfile()]
+    return sorted(name for name in names
+                  if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS)
+
+
+def read_member(file_path: str, member: str) -> bytes:
+    """Read the (still encoded) data of an archive member."""
+    archive, lock = _open_archive(file_path)
+    with lock:
+        if isinstance(archive, zipfile.ZipFile):
+            return archive.read(member)
+        f = archive.extractfile(member)
+        if f is None:
+            raise ValueError(f"{member} is not a file")
+        return f.read()
+
+
+def open_member(file_path: str, member: str) -> io.BytesIO:
+    """Open an archive member as a file object that Pillow can decode from."""
+    return io.BytesIO(read_member(file_path, member))
+
+
+def member_digest(file_path: str, member: str) -> str:
+    """Return the SHA-1 hex digest of an archive member's contents."""
+    return hashlib.sha1(read_member(file_path, member)).hexdigest()
@@ -0,0 +1,102 @@
+"""
+Compare export throughput and file size of the PDF backends.
+
+Usage:
+    python benchmark_backends.py [images ...] [--pages N] [--workers N]
+
+Without image arguments a set of synthetic photos and scans is generated.
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from PIL import Image, ImageDraw
+from models import ImageItem, PageConfig
+from pdf_backends import BACKENDS
+from pdf_generator import PDFGenerator
+
+
+def create_sample_images(directory: str) -> list:
+    """Create a few synthetic sample images and return their paths."""
+    paths = []
+    
+    # Photo-like noise, saved as JPEG (embedded without re-encoding)
+    photo = Image.effect_noise((2400, 1600), 40).convert('RGB')
+    path = os.path.join(directory, 'photo.jpg')
+    photo.save(path, quality=90)
+    paths.append(path)
+    
+    # Scanned text page, saved as PNG (rendered and encoded)
+    scan = Image.new('L', (2480, 3508), 255)
+    draw = ImageDraw.Draw(scan)
+    for y in range(200, 3300, 60):
+        draw.line((200, y, 2280, y), fill=0, width=8)
+    path = os.path.join(directory, 'scan.png')
+    scan.save(path)
+    paths.append(path)
+    
+    # Screenshot-like flat colours, saved as PNG
+    shot = Image.new('RGB', (1920, 1080), (240, 240, 240))
+    draw = ImageDraw.Draw(shot)
+    draw.rectangle((0, 0, 1920, 80), fill=(30, 90, 200))
+    draw.rectangle((100, 200, 900, 900), fill=(255, 255, 255), outline=(0, 0, 0))
+    path = os.path.join(directory, 'screenshot.png')
+    shot.save(path)
+    paths.append(path)
+    
+    return paths
+
+
+def run_benchmark(image_paths: list, pages: int, workers: int):
+    """Export the same document with every backend and print the results."""
+    # Vary the scale slightly so every page is rendered, not deduplicated
+    items = [ImageItem(file_path=image_paths[i % len(image_paths)],
+                       scale=1.0 - (i % 50) * 0.001)
+             for i in range(pages)]
+    page_config = PageConfig()
+    
+    output_dir = tempfile.mkdtemp(prefix='image2pdf_bench_')
+    try:
+        # Warm up imports and caches so the first backend is not penalised
+        PDFGenerator.generate_pdf(os.path.join(output_dir, 'warmup.pdf'),
+                                  items[:1], page_config)
+        
+        print(f"{'Backend':<12}{'Seconds':>10}{'Pages/s':>10}{'Size (KB)':>12}")
+        for name in sorted(BACKENDS):
+            output_path = os.path.join(output_dir, f'{name}.pdf')
+            start = time.perf_counter()
+            success = PDFGenerator.generate_pdf(output_path, items, page_config,
+                                                workers=workers, backend=name)
+            elapsed = time.perf_counter() - start
+            
+            if not success:
+                print(f"{name:<12}{'failed':>10}")
+                continue
+            size_kb = os.path.getsize(output_path) / 1024
+            print(f"{name:<12}{elapsed:>10.2f}{pages / elapsed:>10.1f}{size_kb:>12.0f}")
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('images', nargs='*', help='Source images (default: synthetic samples)')
+    parser.add_argument('--pages', type=int, default=30, help='Number of pages to export')
+    parser.add_argument('--workers', type=int, default=1, help='Render worker processes')
+    args = parser.parse_args()
+    
+    if args.images:
+        run_benchmark(args.images, args.pages, args.workers)
+        return
+    
+    sample_dir = tempfile.mkdtemp(prefix='image2pdf_samples_')
+    try:
+        run_benchmark(create_sample_images(sample_dir), args.pages, args.workers)
+    finally:
+        shutil.rmtree(sample_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
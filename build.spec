@@ -1,7 +1,12 @@
 # -*- mode: python ; coding: utf-8 -*-
 
+import os
+
 block_cipher = None
 
+# 设置环境变量 IMAGE2PDF_NO_REPORTLAB=1 可在打包时排除 reportlab，导出将使用 PyMuPDF 后端
+exclude_reportlab = os.environ.get('IMAGE2PDF_NO_REPORTLAB') == '1'
+
 a = Analysis(
     ['main.py'],
     pathex=[],
@@ -12,15 +17,16 @@ a = Analysis(
         'PyQt5.QtGui',
         'PyQt5.QtWidgets',
         'PIL._tkinter_finder',
-        'reportlab.pdfbase._fontdata',
-        'reportlab.pdfbase._cidfontdata',
         'fitz',
         'fitz.fitz',
-    ],
+    ] + ([] if exclude_reportlab else [
+        'reportlab.pdfbase._fontdata',
+        'reportlab.pdfbase._cidfontdata',
+    ]),
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=['reportlab', 'reportlab_backend'] if exclude_reportlab else [],
     win_no_prefer_redirects=False,
     win_private_assemblies=False,
     cipher=block_cipher,
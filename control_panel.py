@@ -5,11 +5,16 @@ Control panel for adjusting image and page parameters.
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QGroupBox,
                             QLabel, QComboBox, QPushButton, QListWidget,
                             QSlider, QSpinBox, QDoubleSpinBox, QCheckBox,
-                            QColorDialog, QFileDialog, QMessageBox)
+                            QColorDialog, QFileDialog, QMessageBox, QLineEdit)
 from PyQt5.QtCore import Qt, pyqtSignal
 from PyQt5.QtGui import QColor
-from models import ImageItem, PageConfig, ProjectState
+from models import ImageItem, Overlay, PageConfig, ProjectState
 from page_formats import PAGE_FORMATS
+from page_renderer import PAGE_ENCODERS
+from pdf_optimizer import OPTIMIZATION_LEVELS
+from image_processor import ImageProcessor
+import archive_reader
+import raw_reader
 import os
 
 
@@ -64,9 +69,85 @@ class ControlPanel(QWidget):
         margin_layout.addWidget(self.margin_spin)
         page_layout.addLayout(margin_layout)
         
+        # Page image encoder
+        encoder_layout = QHBoxLayout()
+        encoder_layout.addWidget(QLabel("Encoding:"))
+        self.encoder_combo = QComboBox()
+        self.encoder_combo.addItems(PAGE_ENCODERS)
+        self.encoder_combo.setCurrentText(self.state.page_config.encoder)
+        self.encoder_combo.currentTextChanged.connect(self.on_encoder_changed)
+        encoder_layout.addWidget(self.encoder_combo)
+        page_layout.addLayout(encoder_layout)
+        
+        # JPEG quality control
+        quality_layout = QHBoxLayout()
+        quality_layout.addWidget(QLabel("JPEG Quality:"))
+        self.quality_spin = QSpinBox()
+        self.quality_spin.setRange(1, 95)
+        self.quality_spin.setValue(self.state.page_config.jpeg_quality)
+        self.quality_spin.setEnabled(self.state.page_config.encoder in ('auto', 'jpeg'))
+        self.quality_spin.valueChanged.connect(self.on_quality_changed)
+        quality_layout.addWidget(self.quality_spin)
+        page_layout.addLayout(quality_layout)
+        
+        # Post-save optimization
+        optimization_layout = QHBoxLayout()
+        optimization_layout.addWidget(QLabel("Optimization:"))
+        self.optimization_combo = QComboBox()
+        self.optimization_combo.addItems(OPTIMIZATION_LEVELS)
+        self.optimization_combo.setCurrentText(self.state.page_config.optimization)
+        self.optimization_combo.currentTextChanged.connect(self.on_optimization_changed)
+        optimization_layout.addWidget(self.optimization_combo)
+        page_layout.addLayout(optimization_layout)
+        
+        # Target file size
+        target_size_layout = QHBoxLayout()
+        target_size_layout.addWidget(QLabel("Max File Size (MB):"))
+        self.target_size_spin = QDoubleSpinBox()
+        self.target_size_spin.setRange(0, 10000)
+        self.target_size_spin.setSingleStep(1)
+        self.target_size_spin.setSpecialValueText("No limit")
+        self.target_size_spin.setToolTip("Lower JPEG quality and DPI page by page until the PDF fits")
+        self.target_size_spin.setValue(self.state.page_config.target_size_mb)
+        self.target_size_spin.valueChanged.connect(self.on_target_size_changed)
+        target_size_layout.addWidget(self.target_size_spin)
+        page_layout.addLayout(target_size_layout)
+        
+        # Export resolution control
+        dpi_layout = QHBoxLayout()
+        dpi_layout.addWidget(QLabel("Export DPI:"))
+        self.dpi_spin = QSpinBox()
+        self.dpi_spin.setRange(36, 1200)
+        self.dpi_spin.setSingleStep(50)
+        self.dpi_spin.setValue(int(self.state.page_config.target_dpi))
+        self.dpi_spin.valueChanged.connect(self.on_dpi_changed)
+        dpi_layout.addWidget(self.dpi_spin)
+        page_layout.addLayout(dpi_layout)
+        
         page_group.setLayout(page_layout)
         layout.addWidget(page_group)
         
+        # Overlay group: text drawn on top of every exported page
+        overlay_group = QGroupBox("Header, Footer && Watermark")
+        overlay_layout = QVBoxLayout()
+        
+        self.overlay_edits = {}
+        for role, label, placeholder in (
+                ('header', "Header:", ""),
+                ('footer', "Footer:", "e.g. Page {page} of {pages}"),
+                ('watermark', "Watermark:", "e.g. CONFIDENTIAL")):
+            row_layout = QHBoxLayout()
+            row_layout.addWidget(QLabel(label))
+            edit = QLineEdit()
+            edit.setPlaceholderText(placeholder)
+            edit.textChanged.connect(self.on_overlays_changed)
+            row_layout.addWidget(edit)
+            overlay_layout.addLayout(row_layout)
+            self.overlay_edits[role] = edit
+        
+        overlay_group.setLayout(overlay_layout)
+        layout.addWidget(overlay_group)
+        
         # Image list group
         list_group = QGroupBox("Images")
         list_layout = QVBoxLayout()
@@ -113,6 +194,12 @@ class ControlPanel(QWidget):
         self.fit_checkbox.stateChanged.connect(self.on_fit_changed)
         transform_layout.addWidget(self.fit_checkbox)
         
+        # Auto-trim checkbox
+        self.trim_checkbox = QCheckBox("Auto-trim borders")
+        self.trim_checkbox.setToolTip("Crop away blank margins and dark scanner borders")
+        self.trim_checkbox.stateChanged.connect(self.on_trim_changed)
+        transform_layout.addWidget(self.trim_checkbox)
+        
         # Scale slider
         scale_layout = QHBoxLayout()
         scale_layout.addWidget(QLabel("Scale:"))
@@ -201,28 +288,108 @@ class ControlPanel(QWidget):
             self.state.page_config.margin = value
             self.parameter_changed.emit()
     
+    def on_encoder_changed(self, encoder: str):
+        """Handle page encoder change."""
+        self.quality_spin.setEnabled(encoder in ('auto', 'jpeg'))
+        if not self.updating_ui:
+            self.state.page_config.encoder = encoder
+    
+    def on_quality_changed(self, value: int):
+        """Handle JPEG quality change."""
+        if not self.updating_ui:
+            self.state.page_config.jpeg_quality = value
+    
+    def on_optimization_changed(self, level: str):
+        """Handle optimization level change."""
+        if not self.updating_ui:
+            self.state.page_config.optimization = level
+    
+    def on_target_size_changed(self, value: float):
+        """Handle target file size change."""
+        if not self.updating_ui:
+            self.state.page_config.target_size_mb = value
+    
+    def on_overlays_changed(self):
+        """Rebuild the page overlays from the header, footer and watermark texts."""
+        if self.updating_ui:
+            return
+        header = self.overlay_edits['header'].text()
+        footer = self.overlay_edits['footer'].text()
+        watermark = self.overlay_edits['watermark'].text()
+        overlays = []
+        if header:
+            overlays.append(Overlay(text=header, y=0.03, font_size=10))
+        if footer:
+            overlays.append(Overlay(text=footer, y=0.97, font_size=9))
+        if watermark:
+            overlays.append(Overlay(text=watermark, font_size=60, color=(128, 128, 128),
+                                    opacity=0.25, rotation=45))
+        self.state.page_config.overlays = overlays
+    
+    def on_dpi_changed(self, value: int):
+        """Handle export DPI change."""
+        if not self.updating_ui:
+            self.state.page_config.target_dpi = float(value)
+    
     def add_images(self):
         """Open file dialog to add images."""
         files, _ = QFileDialog.getOpenFileNames(
             self,
             "Select Images",
             "",
-            "Images (*.png *.jpg *.jpeg *.bmp *.gif *.tiff *.webp)"
+            "Images (*.png *.jpg *.jpeg *.bmp *.gif *.tif *.tiff *.webp *.npy *.raw *.bin "
+            "*.zip *.cbz *.tar *.cbt)"
         )
         
         if files:
+            first_new_row = len(self.state.images)
             for file_path in files:
-                item = ImageItem(file_path=file_path)
-                self.state.images.append(item)
-                # Add to list widget
-                self.image_list.addItem(os.path.basename(file_path))
+                name = os.path.basename(file_path)
+                if archive_reader.is_archive(file_path):
+                    # Every image in an archive becomes a page, read from the
+                    # archive without extracting it
+                    try:
+                        members = archive_reader.list_images(file_path)
+                    except Exception as e:
+                        print(f"Error reading archive {file_path}: {str(e)}")
+                        continue
+                    for member in members:
+                        self.add_source(file_path, f"{name}/{member}", archive_member=member)
+                    continue
+                
+                raw_format = None
+                if raw_reader.is_raw_file(file_path):
+                    # Keep the frame layout with the item, so it is part of the page
+                    try:
+                        raw_format = raw_reader.read_sidecar(file_path)
+                    except (ValueError, TypeError) as e:
+                        print(f"Error reading frame layout of {file_path}: {str(e)}")
+                self.add_source(file_path, name, raw_format=raw_format)
             
             # Select the first newly added image
-            if len(self.state.images) > 0:
-                self.image_list.setCurrentRow(len(self.state.images) - len(files))
+            if len(self.state.images) > first_new_row:
+                self.image_list.setCurrentRow(first_new_row)
             
             self.image_list_changed.emit()
     
+    def add_source(self, file_path: str, name: str, raw_format=None, archive_member: str = ''):
+        """
+        Add the pages of one image file or archive member to the list.
+        
+        Multi-page TIFFs and animated images add one page per frame;
+        frames are only decoded when they are previewed or exported.
+        """
+        frame_count = ImageProcessor.frame_count(file_path, raw_format, archive_member)
+        for frame_index in range(frame_count):
+            item = ImageItem(file_path=file_path, frame_index=frame_index,
+                             raw_format=raw_format, archive_member=archive_member)
+            self.state.images.append(item)
+            # Add to list widget
+            if frame_count > 1:
+                self.image_list.addItem(f"{name} [page {frame_index + 1}/{frame_count}]")
+            else:
+                self.image_list.addItem(name)
+    
     def remove_current_image(self):
         """Remove the currently selected image."""
         current_row = self.image_list.currentRow()
@@ -299,6 +466,7 @@ class ControlPanel(QWidget):
         item = self.state.images[self.state.current_image_index]
         
         self.fit_checkbox.setChecked(item.fit_to_page)
+        self.trim_checkbox.setChecked(item.auto_trim)
         self.scale_slider.setValue(int(item.scale * 100))
         self.pos_x_slider.setValue(int(item.position_x * 100))
         self.pos_y_slider.setValue(int(item.position_y * 100))
@@ -315,6 +483,13 @@ class ControlPanel(QWidget):
             item.fit_to_page = self.fit_checkbox.isChecked()
             self.parameter_changed.emit()
     
+    def on_trim_changed(self, state):
+        """Handle auto-trim checkbox change."""
+        if not self.updating_ui and self.state.current_image_index >= 0:
+            item = self.state.images[self.state.current_image_index]
+            item.auto_trim = self.trim_checkbox.isChecked()
+            self.parameter_changed.emit()
+    
     def on_scale_changed(self, value: int):
         """Handle scale slider change."""
         scale = value / 100.0
@@ -0,0 +1,151 @@
+"""
+Checkpoint journal for long-running exports.
+
+The journal is a directory per output file. Every rendered page
+is stored there as soon as it is complete. Running the same export
+again with the same journal reuses the stored pages, so a job that
+crashed or was interrupted at page 4,000 resumes there instead of
+rendering everything again. The journal is removed once the export
+succeeds.
+
+The application keeps its journals beside the render cache (see
+journals_dir), e.g. in ~/.cache/image2pdf/journals on Linux. Journals
+of exports that were never finished are pruned by age and total size
+(see prune_journals), and `python render_cache.py info` and `clear`
+cover them as well.
+"""
+
+import hashlib
+import os
+import shutil
+import sys
+import time
+from typing import List, Optional, Tuple
+from page_renderer import RenderedPage
+from render_cache import RenderCache, default_cache_dir
+
+
+# Journals not used for this long are removed by prune_journals
+JOURNAL_MAX_AGE = 7 * 24 * 60 * 60  # 1 week
+
+# Total size of the kept journals; the least recently used go beyond it
+JOURNALS_MAX_BYTES = 2 * 1024 * 1024 * 1024  # 2 GB
+
+
+def journals_dir() -> str:
+    """Return the directory holding the application's export journals."""
+    return os.path.join(os.path.dirname(default_cache_dir()), 'journals')
+
+
+def default_journal_dir(output_path: str) -> str:
+    """Return the journal directory for an output file, in the user's cache directory."""
+    name = hashlib.sha1(os.path.abspath(output_path).encode('utf-8')).hexdigest()
+    return os.path.join(journals_dir(), name)
+
+
+def _journals(directory: str) -> List[Tuple[float, int, str]]:
+    """List the journals in a directory as (last use, size, path), oldest first."""
+    journals = []
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return journals
+    for name in names:
+        path = os.path.join(directory, name)
+        if not os.path.isdir(path):
+            continue
+        last_use = os.path.getmtime(path)
+        size = 0
+        for root, _, files in os.walk(path):
+            for file_name in files:
+                try:
+                    stat = os.stat(os.path.join(root, file_name))
+                except OSError:
+                    continue
+                last_use = max(last_use, stat.st_mtime)
+                size += stat.st_size
+        journals.append((last_use, size, path))
+    journals.sort()
+    return journals
+
+
+def journals_info(directory: Optional[str] = None) -> dict:
+    """Return the journals directory, the number of journals and their size."""
+    directory = directory or journals_dir()
+    journals = _journals(directory)
+    return {
+        "directory": directory,
+        "journals": len(journals),
+        "size": sum(size for _, size, _ in journals),
+    }
+
+
+def prune_journals(directory: Optional[str] = None, keep: Optional[str] = None,
+                   max_age: float = JOURNAL_MAX_AGE, max_bytes: int = JOURNALS_MAX_BYTES):
+    """
+    Remove journals of exports that were abandoned.
+    
+    Args:
+        directory: Journals directory (defaults to journals_dir())
+        keep: Journal that is about to be used and must stay
+        max_age: Journals not used for this many seconds are removed
+        max_bytes: The least recently used journals are removed until the
+                   rest fit in this size
+    """
+    journals = _journals(directory or journals_dir())
+    total = sum(size for _, size, _ in journals)
+    oldest = time.time() - max_age
+    for last_use, size, path in journals:
+        if keep is not None and os.path.abspath(path) == os.path.abspath(keep):
+            continue
+        if last_use < oldest or total > max_bytes:
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+
+def clear_journals(directory: Optional[str] = None):
+    """Remove all journals."""
+    shutil.rmtree(directory or journals_dir(), ignore_errors=True)
+
+
+class ExportJournal(RenderCache):
+    """Page store and progress log of one export, usable as its render cache."""
+    
+    def __init__(self, directory: str, cache: Optional[RenderCache] = None):
+        """
+        Args:
+            directory: Journal directory; created if needed
+            cache: Optional regular render cache, looked up for pages that
+                   are not in the journal and kept up to date as well
+        """
+        # The journal must keep every page until the export is done; its
+        # time of last use is what prune_journals goes by
+        super().__init__(directory, max_bytes=sys.maxsize)
+        os.utime(directory)
+        self.cache = cache
+        self._stored_keys = self.keys()
+        self._resumed_keys = set()
+    
+    @property
+    def resumed_pages(self) -> int:
+        """Number of distinct pages reused from an earlier run."""
+        return len(self._resumed_keys)
+    
+    def get(self, key: str) -> Optional[RenderedPage]:
+        """Look up a page in the journal, then in the regular cache."""
+        page = super().get(key)
+        if page is not None:
+            if key in self._stored_keys:
+                self._resumed_keys.add(key)
+            return page
+        return self.cache.get(key) if self.cache is not None else None
+    
+    def put(self, key: str, page: RenderedPage):
+        """Store a page in the journal and the regular cache."""
+        super().put(key, page)
+        if self.cache is not None:
+            self.cache.put(key, page)
+    
+    def remove(self):
+        """Delete the journal."""
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,247 @@
+"""
+Content analysis for automatic page image encoding and border trimming.
+
+A small nearest-neighbour sample of each page image is analysed with
+NumPy to tell photos apart from screenshots, line art and scanned text,
+and to pick the encoder and colour reduction for the page. Sampling keeps
+the analysis far cheaper than the encode it decides on.
+
+content_bounds finds the content of a scan inside blank paper margins or
+a dark scanner bed, from row and column statistics of a reduced probe.
+"""
+
+from dataclasses import dataclass
+from typing import Optional, Tuple
+from PIL import Image
+import numpy as np
+
+
+# Longest side of the sample that is analysed
+SAMPLE_SIZE = 256
+
+# Largest difference between colour channels of a pixel that still counts as gray
+GRAY_TOLERANCE = 24
+
+# Luminance step between neighbouring pixels that counts as an edge
+EDGE_STEP = 48
+
+# Lookup table that thresholds gray pixels to 1-bit at 50%, for bilevel
+# pages and for bilevel images resampled in grayscale
+BILEVEL_LUT = [0] * 128 + [255] * 128
+
+# Share of near-black and near-white pixels above which a gray page is bilevel
+BILEVEL_FRACTION = 0.95
+
+# Share of mid-tone pixels away from edges below which a gray page can be
+# bilevel, so smooth gray shading on a white page is not thresholded
+BILEVEL_MIDTONE_FRACTION = 0.01
+
+# Share of distinct colours in the sample above which an image is a photo
+PHOTO_UNIQUE_RATIO = 0.15
+
+# Share of identical neighbouring pixels below which an image is a photo
+PHOTO_FLAT_FRACTION = 0.5
+
+# Edge density above which an image is text or line art, never a photo
+TEXT_EDGE_DENSITY = 0.2
+
+# Most colours an image can have to be embedded with an indexed palette
+MAX_PALETTE_COLORS = 256
+
+# Share of a row or column that must differ from the border to be content,
+# so dust and scanner noise do not stop the trim
+TRIM_MIN_FRACTION = 0.005
+
+# Borders trimmed one inside the other, e.g. a scanner bed around a margin
+TRIM_PASSES = 2
+
+
+@dataclass
+class ImageStats:
+    """Statistics of a page image sample."""
+    gray: bool  # All pixels are (nearly) neutral
+    unique_ratio: float  # Distinct colours per pixel, after dropping the two low bits
+    edge_density: float  # Share of neighbouring pixel pairs that form an edge
+    flat_fraction: float  # Share of neighbouring pixel pairs that are identical
+    extreme_fraction: float  # Share of near-black or near-white pixels
+    midtone_fraction: float  # Share of mid-tone pixels that are not next to an edge
+
+
+def analyze_image(img: Image.Image) -> ImageStats:
+    """
+    Compute colour, edge and histogram statistics of an image.
+    
+    Args:
+        img: RGB or L image
+    
+    Returns:
+        ImageStats of a nearest-neighbour sample of the image
+    """
+    scale = min(1.0, SAMPLE_SIZE / max(img.size))
+    if scale < 1.0:
+        sample_size = (max(1, int(img.width * scale)), max(1, int(img.height * scale)))
+        img = img.resize(sample_size, Image.Resampling.NEAREST)
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    pixels = np.asarray(img, dtype=np.int32)
+    
+    if pixels.ndim == 2:
+        gray = True
+        luma = pixels
+        keys = pixels >> 2
+    else:
+        spread = pixels.max(axis=2) - pixels.min(axis=2)
+        gray = bool(spread.max() <= GRAY_TOLERANCE)
+        luma = (pixels[..., 0] * 299 + pixels[..., 1] * 587 + pixels[..., 2] * 114) // 1000
+        quantized = pixels >> 2
+        keys = (quantized[..., 0] << 12) | (quantized[..., 1] << 6) | quantized[..., 2]
+    
+    edges = 0
+    flat = 0
+    pairs = 0
+    # Pixels on either side of an edge, where anti-aliasing leaves mid-tones
+    on_edge = np.zeros(luma.shape, dtype=bool)
+    for axis in (0, 1):
+        if luma.shape[axis] > 1:
+            steps = np.abs(np.diff(luma, axis=axis))
+            sharp = steps > EDGE_STEP
+            edges += int(sharp.sum())
+            flat += int((steps == 0).sum())
+            pairs += steps.size
+            if axis == 0:
+                on_edge[:-1] |= sharp
+                on_edge[1:] |= sharp
+            else:
+                on_edge[:, :-1] |= sharp
+                on_edge[:, 1:] |= sharp
+    extreme = (luma < 48) | (luma > 207)
+    
+    return ImageStats(
+        gray=gray,
+        unique_ratio=np.unique(keys).size / keys.size,
+        edge_density=edges / pairs if pairs else 0.0,
+        flat_fraction=flat / pairs if pairs else 1.0,
+        extreme_fraction=float(extreme.mean()),
+        midtone_fraction=float((~extreme & ~on_edge).mean()),
+    )
+
+
+def to_palette(img: Image.Image) -> Optional[Image.Image]:
+    """
+    Convert an RGB image to palette mode without losing colours.
+    
+    Returns:
+        P image whose palette holds exactly the image's colours, or None
+        if the image has more than MAX_PALETTE_COLORS colours
+    """
+    colors = img.getcolors(MAX_PALETTE_COLORS)
+    if colors is None:
+        return None
+    palette = Image.new('P', (1, 1))
+    palette.putpalette([value for _, rgb in colors for value in rgb])
+    return img.quantize(palette=palette, dither=Image.Dither.NONE)
+
+
+def choose_encoding(img: Image.Image) -> Tuple[Image.Image, str]:
+    """
+    Pick the encoder and colour reduction for a page image.
+    
+    - bilevel pages (near-pure black and white, with mid-tones only on
+      the anti-aliased edges) become 1-bit images, which are embedded
+      with CCITT G4
+    - gray pages become 8-bit grayscale
+    - everything else (screenshots, line art, charts) uses Flate, with
+      an indexed palette when they have at most MAX_PALETTE_COLORS colours
+    - images with many distinct colours or few flat areas, and not so
+      many sharp edges that they look like text, are photos and use JPEG
+    
+    Args:
+        img: RGB, L or 1-bit image
+    
+    Returns:
+        Tuple of (image, encoder): the image, possibly converted to 'L',
+        '1' or 'P' mode, and 'flate' or 'jpeg'
+    """
+    if img.mode == '1':
+        return img, 'flate'
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    
+    stats = analyze_image(img)
+    if stats.gray and img.mode != 'L':
+        img = img.convert('L')
+    
+    if (img.mode == 'L' and stats.extreme_fraction >= BILEVEL_FRACTION
+            and stats.midtone_fraction < BILEVEL_MIDTONE_FRACTION):
+        return img.point(BILEVEL_LUT, '1'), 'flate'
+    
+    photo = (stats.unique_ratio >= PHOTO_UNIQUE_RATIO
+             or stats.flat_fraction < PHOTO_FLAT_FRACTION)
+    if photo and stats.edge_density < TEXT_EDGE_DENSITY:
+        return img, 'jpeg'
+    
+    if img.mode == 'RGB':
+        indexed = to_palette(img)
+        if indexed is not None:
+            return indexed, 'flate'
+    return img, 'flate'
+
+
+def _drop_edge_lines(content: np.ndarray):
+    """Clear a single content line at either end that is followed by border."""
+    if content.size > 2:
+        if content[0] and not content[1]:
+            content[0] = False
+        if content[-1] and not content[-2]:
+            content[-1] = False
+
+
+def content_bounds(pixels: np.ndarray, tolerance: int) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Find the box of an image that is not uniform border.
+    
+    The border colour is the per-channel median of the outermost rows and
+    columns. Rows and columns where more than TRIM_MIN_FRACTION of the
+    pixels differ from it by more than the tolerance are content. After a
+    trim, the new edges are checked again (up to TRIM_PASSES times), so a
+    dark scanner bed and the blank paper margin inside it both go.
+    
+    Args:
+        pixels: Image as an array of shape (height, width) or (height, width, channels)
+        tolerance: Largest channel difference from the border colour that
+                   still counts as border (0-255)
+    
+    Returns:
+        Box (left, top, right, bottom) in pixels, or None if the whole
+        image is border (a blank page)
+    """
+    if pixels.ndim == 2:
+        pixels = pixels[..., np.newaxis]
+    pixels = pixels.astype(np.int16)
+    left, top = 0, 0
+    bottom, right = pixels.shape[:2]
+    
+    for trim_pass in range(TRIM_PASSES):
+        region = pixels[top:bottom, left:right]
+        edges = np.concatenate((region[0], region[-1], region[:, 0], region[:, -1]))
+        border = np.median(edges, axis=0)
+        content = (np.abs(region - border) > tolerance).any(axis=2)
+        rows = content.mean(axis=1) > TRIM_MIN_FRACTION
+        columns = content.mean(axis=0) > TRIM_MIN_FRACTION
+        if trim_pass:
+            # The previous trim can leave a line where the sample blended
+            # the outer border with the one inside it
+            _drop_edge_lines(rows)
+            _drop_edge_lines(columns)
+        rows = np.flatnonzero(rows)
+        columns = np.flatnonzero(columns)
+        if rows.size == 0 or columns.size == 0:
+            # A blank page on the first pass; later, a uniform area that
+            # was the content inside the outer border
+            return None if trim_pass == 0 else (left, top, right, bottom)
+        box = (left + int(columns[0]), top + int(rows[0]),
+               left + int(columns[-1]) + 1, top + int(rows[-1]) + 1)
+        if box == (left, top, right, bottom):
+            break
+        left, top, right, bottom = box
+    return (left, top, right, bottom)
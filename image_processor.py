@@ -3,30 +3,224 @@ Image processing module for loading, transforming, and preparing images.
 """
 
 from PIL import Image, ImageDraw
-from typing import Tuple
-from models import ImageItem, CropRect
+from dataclasses import replace
+from typing import Optional, Tuple
+from models import ImageItem, CropRect, RawFormat
+from image_analysis import BILEVEL_LUT, content_bounds
 import io
+import math
+import numpy as np
+import archive_reader
+import raw_reader
+import tiled_reader
+
+
+# Default memory ceiling for decoding one source image, in MB
+DEFAULT_MEMORY_LIMIT_MB = 1024
+
+
+# Sources are only reduced while they stay at least this many times larger
+# than needed, so the final LANCZOS resample still has pixels to work with
+# (the same default Pillow uses for thumbnails)
+REDUCING_GAP = 2.0
+
+# Formats whose frames are separate pages. Others can report several
+# frames too, e.g. MPO (a JPEG with an embedded preview or gain map), but
+# only the first frame is the picture
+MULTI_FRAME_FORMATS = ('TIFF', 'GIF', 'WEBP')
+
+# Extensions of those formats; other archive members are not decoded just
+# to count their frames
+MULTI_FRAME_EXTENSIONS = ('.tif', '.tiff', '.gif', '.webp')
+
+# Longest side of the reduced probe that automatic trimming looks at
+TRIM_PROBE_SIZE = 512
+
+# Clockwise rotations that are an exact pixel permutation
+RIGHT_ANGLE_TRANSPOSES = {
+    0: None,
+    90: Image.Transpose.ROTATE_270,
+    180: Image.Transpose.ROTATE_180,
+    270: Image.Transpose.ROTATE_90,
+}
 
 
 class ImageProcessor:
     """Handles image loading and transformation."""
     
     @staticmethod
-    def load_image(file_path: str) -> Image.Image:
-        """Load an image from file."""
+    def open_image(file_path: str, frame_index: int = 0,
+                   raw_format: Optional[RawFormat] = None,
+                   archive_member: str = '') -> Image.Image:
+        """
+        Open one frame of an image file without decoding its pixel data.
+        
+        Raw frame dumps and .npy arrays are memory-mapped instead (see
+        raw_reader), so their pixels are read on demand as well. Archive
+        members are decoded from the archive (see archive_reader).
+        
+        Pillow's decompression-bomb check is skipped (see
+        tiled_reader.open_image); callers check the memory the image needs
+        before they decode it.
+        
+        Args:
+            file_path: Path to the image file, or to the archive
+            frame_index: Frame of a multi-page or animated image
+            raw_format: Frame layout of a raw file, if not in a sidecar
+            archive_member: Member of the archive at file_path, if any
+        
+        Returns:
+            Image positioned at the requested frame
+        """
+        if archive_member:
+            img = tiled_reader.open_image(archive_reader.open_member(file_path, archive_member))
+        elif raw_reader.is_raw_file(file_path):
+            return raw_reader.open_frame(file_path, frame_index, raw_format)
+        else:
+            img = tiled_reader.open_image(file_path)
+        if frame_index:
+            img.seek(frame_index)
+        return img
+    
+    @staticmethod
+    def frame_count(file_path: str, raw_format: Optional[RawFormat] = None,
+                    archive_member: str = '') -> int:
+        """Return the number of frames (pages) in an image file or archive member."""
         try:
-            img = Image.open(file_path)
-            # Convert to RGB if needed (handles RGBA, grayscale, etc.)
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            return img
+            if archive_member:
+                if not archive_member.lower().endswith(MULTI_FRAME_EXTENSIONS):
+                    return 1
+            elif raw_reader.is_raw_file(file_path):
+                return raw_reader.frame_count(file_path, raw_format)
+            with ImageProcessor.open_image(file_path, 0, raw_format, archive_member) as img:
+                if img.format not in MULTI_FRAME_FORMATS:
+                    return 1
+                return getattr(img, 'n_frames', 1)
+        except Exception:
+            # Unreadable files are reported when they are rendered
+            return 1
+    
+    @staticmethod
+    def load_image(file_path: str,
+                   min_size: Optional[Tuple[float, float]] = None,
+                   frame_index: int = 0,
+                   memory_limit_mb: float = DEFAULT_MEMORY_LIMIT_MB) -> Image.Image:
+        """
+        Load an image from file.
+        
+        Args:
+            file_path: Path to the image file
+            min_size: Smallest (width, height) the whole image is needed at.
+                      If given, larger sources are decoded at reduced
+                      resolution (see decode_image)
+            frame_index: Frame of a multi-page or animated image
+            memory_limit_mb: Memory ceiling for decoding the image
+        
+        Returns:
+            Image in its native mode (see native_mode)
+        """
+        try:
+            img = ImageProcessor.open_image(file_path, frame_index)
+            return ImageProcessor.decode_image(img, min_size,
+                                               int(memory_limit_mb * 1024 * 1024))
         except Exception as e:
             raise ValueError(f"Failed to load image {file_path}: {str(e)}")
     
     @staticmethod
-    def apply_crop(img: Image.Image, crop: CropRect) -> Image.Image:
-        """Apply crop to image using normalized coordinates."""
-        width, height = img.size
+    def reduction_factor(size: Tuple[int, int], min_size: Tuple[float, float]) -> int:
+        """
+        Calculate by which integer factor an image can be shrunk before resampling.
+        
+        Returns:
+            Factor (1 means no reduction)
+        """
+        factor = min(size[0] / (max(min_size[0], 1) * REDUCING_GAP),
+                     size[1] / (max(min_size[1], 1) * REDUCING_GAP))
+        return max(1, int(factor))
+    
+    @staticmethod
+    def decode_image(img: Image.Image,
+                     min_size: Optional[Tuple[float, float]] = None,
+                     memory_limit: Optional[int] = None) -> Image.Image:
+        """
+        Decode an opened image in its native mode (see native_mode).
+        
+        When the image is only needed at min_size, JPEG sources are decoded
+        at 1/2, 1/4 or 1/8 scale directly by libjpeg, and any remaining
+        integer factor is removed with Image.reduce, so the full-resolution
+        pixels never have to be resampled.
+        
+        Args:
+            img: Image returned by Image.open (not yet loaded)
+            min_size: Smallest (width, height) the image is needed at, or None
+            memory_limit: Maximum bytes the decoded image may use, or None
+        
+        Returns:
+            RGB, L or 1-bit image, or RGBA or LA if the source is
+            transparent; at least REDUCING_GAP times larger than min_size
+            if it was reduced (bilevel images become L then)
+        """
+        if min_size is not None and img.format == 'JPEG':
+            if ImageProcessor.reduction_factor(img.size, min_size) > 1:
+                # DCT-domain scaling; picks the largest scale that is still
+                # at least as large as the requested size
+                img.draft(img.mode, (math.ceil(min_size[0] * REDUCING_GAP),
+                                     math.ceil(min_size[1] * REDUCING_GAP)))
+        
+        # Fail before decoding rather than exhausting memory
+        tiled_reader.check_memory(img.size, img.mode, memory_limit)
+        
+        # Convert to RGB if needed (handles palette, CMYK, etc.)
+        mode = ImageProcessor.native_mode(img.mode, 'transparency' in img.info)
+        if img.mode != mode:
+            img = img.convert(mode)
+        
+        if min_size is not None:
+            factor = ImageProcessor.reduction_factor(img.size, min_size)
+            if factor > 1:
+                # Pillow cannot average 1-bit pixels
+                if img.mode == '1':
+                    img = img.convert('L')
+                img = img.reduce(factor)
+        return img
+    
+    @staticmethod
+    def native_mode(mode: str, transparency: bool = False) -> str:
+        """
+        Return the mode an image is processed in.
+        
+        Grayscale and bilevel images keep their mode, so they stay small in
+        memory and are embedded with a DeviceGray colour space. Transparent
+        images keep an alpha channel (LA or RGBA), which is embedded as a
+        soft mask over the page background. Everything else is processed
+        as RGB.
+        
+        Args:
+            mode: Mode of the source image
+            transparency: Whether the source has a transparent colour or
+                          palette entry (the 'transparency' info key)
+        """
+        if mode == '1':
+            return mode
+        if mode in ('L', 'LA'):
+            return 'LA' if mode == 'LA' or transparency else 'L'
+        if mode in ('RGBA', 'PA') or transparency:
+            return 'RGBA'
+        return 'RGB'
+    
+    @staticmethod
+    def to_bilevel(img: Image.Image) -> Image.Image:
+        """Threshold a grayscale image back to 1-bit after resampling."""
+        if img.mode == '1':
+            return img
+        if img.mode != 'L':
+            img = img.convert('L')
+        return img.point(BILEVEL_LUT, '1')
+    
+    @staticmethod
+    def crop_box(size: Tuple[int, int], crop: CropRect) -> Tuple[int, int, int, int]:
+        """Convert a normalized crop to a pixel box (left, top, right, bottom)."""
+        width, height = size
         
         # Convert normalized coordinates to pixels
         left = int(crop.x * width)
@@ -40,7 +234,91 @@ class ImageProcessor:
         right = max(left, min(right, width))
         bottom = max(top, min(bottom, height))
         
-        return img.crop((left, top, right, bottom))
+        return (left, top, right, bottom)
+    
+    @staticmethod
+    def apply_crop(img: Image.Image, crop: CropRect) -> Image.Image:
+        """Apply crop to image using normalized coordinates."""
+        return img.crop(ImageProcessor.crop_box(img.size, crop))
+    
+    @staticmethod
+    def trim_crop(item: ImageItem,
+                  memory_limit_mb: float = DEFAULT_MEMORY_LIMIT_MB) -> CropRect:
+        """
+        Find the crop that removes an image's uniform borders.
+        
+        The borders are detected on a probe of at most TRIM_PROBE_SIZE
+        pixels, decoded at reduced resolution where the format allows it
+        (see decode_image), and the result is kept inside the item's own
+        crop. One probe pixel is kept around the content so anti-aliased
+        edges are not cut.
+        
+        Args:
+            item: ImageItem with auto_trim and trim_tolerance settings
+            memory_limit_mb: Memory ceiling for decoding the probe
+        
+        Returns:
+            CropRect in normalized coordinates of the full image
+        """
+        memory_limit = int(memory_limit_mb * 1024 * 1024)
+        try:
+            source = ImageProcessor.open_image(item.file_path, item.frame_index,
+                                                item.raw_format, item.archive_member)
+        except Exception as e:
+            raise ValueError(f"Failed to load image {item.file_path}: {str(e)}")
+        
+        scale = min(1.0, TRIM_PROBE_SIZE / max(source.size))
+        probe_size = (max(1, round(source.width * scale)), max(1, round(source.height * scale)))
+        mode = 'RGB' if ImageProcessor.native_mode(source.mode) in ('RGB', 'RGBA') else 'L'
+        try:
+            # Band decoding reads plain files only, not archive members
+            if (not item.archive_member
+                    and tiled_reader.image_tiles(source) is not None
+                    and tiled_reader.decoded_bytes(source.size, source.mode) > memory_limit):
+                probe = tiled_reader.resize_region(
+                    item.file_path, item.frame_index, source.size, (0, 0) + source.size,
+                    probe_size, memory_limit, REDUCING_GAP, mode
+                )
+            else:
+                probe = ImageProcessor.decode_image(source, probe_size, memory_limit)
+                if probe.size != probe_size:
+                    probe = probe.resize(probe_size, Image.Resampling.NEAREST)
+            # The probe can be the source itself, so read it before closing that
+            pixels = np.asarray(probe.convert(mode))
+        except Exception as e:
+            raise ValueError(f"Failed to load image {item.file_path}: {str(e)}")
+        finally:
+            source.close()
+        
+        bounds = content_bounds(pixels, item.trim_tolerance)
+        crop = item.crop
+        if bounds is None:
+            # A blank page has no content to trim to
+            return crop
+        width, height = probe_size
+        left = max(crop.x, (bounds[0] - 1) / width)
+        top = max(crop.y, (bounds[1] - 1) / height)
+        right = min(crop.x + crop.width, (bounds[2] + 1) / width)
+        bottom = min(crop.y + crop.height, (bounds[3] + 1) / height)
+        if right <= left or bottom <= top:
+            # The content lies outside the manual crop
+            return crop
+        return CropRect(left, top, right - left, bottom - top)
+    
+    @staticmethod
+    def resolve_auto_trim(item: ImageItem,
+                          memory_limit_mb: float = DEFAULT_MEMORY_LIMIT_MB) -> ImageItem:
+        """
+        Replace automatic trimming with the crop it amounts to.
+        
+        Returns:
+            The item itself without auto_trim, otherwise a copy whose crop
+            is trim_crop(item)
+        """
+        if not item.auto_trim:
+            return item
+        return replace(item, crop=ImageProcessor.trim_crop(item, memory_limit_mb),
+                       auto_trim=False)
     
     @staticmethod
     def rotate_image(img: Image.Image, angle: int) -> Image.Image:
@@ -59,7 +337,20 @@ class ImageProcessor:
         Returns:
             Tuple of (width, height) in pixels
         """
-        img_width, img_height = img.size
+        new_width, new_height = ImageProcessor.fit_size(img.size, max_width, max_height,
+                                                        scale_factor)
+        return (int(new_width), int(new_height))
+    
+    @staticmethod
+    def fit_size(size: Tuple[float, float], max_width: float, max_height: float,
+                 scale_factor: float = 1.0) -> Tuple[float, float]:
+        """
+        Calculate dimensions to fit a size within max bounds while maintaining aspect ratio.
+        
+        Returns:
+            Tuple of (width, height), unrounded
+        """
+        img_width, img_height = size
         aspect_ratio = img_width / img_height
         
         # Calculate dimensions that fit within bounds
@@ -73,10 +364,41 @@ class ImageProcessor:
             new_width = max_height * aspect_ratio
         
         # Apply additional scale factor
-        new_width = int(new_width * scale_factor)
-        new_height = int(new_height * scale_factor)
+        return (new_width * scale_factor, new_height * scale_factor)
+    
+    @staticmethod
+    def compute_placement(size: Tuple[float, float], item: ImageItem,
+                          page_width: float, page_height: float,
+                          margin: float) -> Tuple[float, float, float, float]:
+        """
+        Calculate where an image lands on the page.
+        
+        Uses the same rules as process_image_item, but without rounding, so
+        the result can be used to place an image with PDF operators.
+        
+        Args:
+            size: Size of the cropped and rotated image in pixels
+            item: ImageItem with transformation parameters
+            page_width: Page width in points
+            page_height: Page height in points
+            margin: Margin in points
         
-        return (new_width, new_height)
+        Returns:
+            Tuple of (x, y, width, height) in points, measured from the top-left corner
+        """
+        available_width = page_width - 2 * margin
+        available_height = page_height - 2 * margin
+        
+        if item.fit_to_page:
+            width, height = ImageProcessor.fit_size(size, available_width,
+                                                    available_height, item.scale)
+        else:
+            # One pixel per point, as in process_image_item
+            width, height = size[0] * item.scale, size[1] * item.scale
+        
+        x = (page_width - width) * item.position_x
+        y = (page_height - height) * item.position_y
+        return (x, y, width, height)
     
     @staticmethod
     def place_on_background(img: Image.Image, page_width: int, page_height: int,
@@ -96,8 +418,15 @@ class ImageProcessor:
         Returns:
             New image with background
         """
-        # Create background
-        background = Image.new('RGB', (page_width, page_height), bg_color)
+        # Create background; grayscale images on a neutral colour stay grayscale
+        if img.mode in ('1', 'L', 'LA') and bg_color[0] == bg_color[1] == bg_color[2]:
+            background = Image.new('L', (page_width, page_height), bg_color[0])
+        else:
+            background = Image.new('RGB', (page_width, page_height), bg_color)
+        # Transparent images are composited over the background
+        mask = img.getchannel('A') if img.mode in ('RGBA', 'LA') else None
+        if img.mode != background.mode:
+            img = img.convert(background.mode)
         
         # Calculate position to center the image
         img_width, img_height = img.size
@@ -105,59 +434,164 @@ class ImageProcessor:
         y = int((page_height - img_height) * pos_y)
         
         # Paste image onto background
-        background.paste(img, (x, y))
+        background.paste(img, (x, y), mask)
         
         return background
     
     @staticmethod
-    def process_image_item(item: ImageItem, page_width: float, page_height: float,
-                          margin: float, bg_color: Tuple[int, int, int]) -> Image.Image:
+    def render_image_region(item: ImageItem, page_width: float, page_height: float,
+                            margin: float, dpi: float = 72.0,
+                            allow_upscale: bool = False,
+                            memory_limit_mb: float = DEFAULT_MEMORY_LIMIT_MB) -> Tuple[Image.Image, Tuple[float, float, float, float]]:
         """
-        Process an image item with all transformations applied.
+        Render only the placed image region of a page.
         
         Args:
             item: ImageItem with transformation parameters
             page_width: Page width in points
             page_height: Page height in points
             margin: Margin in points
-            bg_color: Background color
+            dpi: Raster resolution of the placed region
+            allow_upscale: If False, sources with fewer pixels than the
+                           requested resolution keep their own size
+            memory_limit_mb: Memory ceiling for decoding the source; images
+                             stored in strips or tiles are processed in bands
+                             to stay below it, others fail if they exceed it
         
         Returns:
-            Processed PIL Image ready for PDF
+            Tuple of (image, placement), where placement is (x, y, width, height)
+            in points measured from the top-left corner of the page
         """
-        # Load image
-        img = ImageProcessor.load_image(item.file_path)
+        # Open the image; only the header is read at this point
+        try:
+            source = ImageProcessor.open_image(item.file_path, item.frame_index,
+                                                item.raw_format, item.archive_member)
+        except Exception as e:
+            raise ValueError(f"Failed to load image {item.file_path}: {str(e)}")
+        
+        # Lay out the page from the full-resolution size of the cropped,
+        # rotated image, so the result does not depend on how it is decoded
+        left, top, right, bottom = ImageProcessor.crop_box(source.size, item.crop)
+        region_size = (right - left, bottom - top)
+        if item.rotation % 180 == 90:
+            region_size = (region_size[1], region_size[0])
+        placement = ImageProcessor.compute_placement(region_size, item, page_width,
+                                                     page_height, margin)
+        
+        # Calculate pixel size of the placed region at the requested DPI
+        scale = dpi / 72.0
+        new_size = (max(1, int(placement[2] * scale)), max(1, int(placement[3] * scale)))
         
-        # Apply crop
-        if not (item.crop.x == 0 and item.crop.y == 0 and 
-                item.crop.width == 1.0 and item.crop.height == 1.0):
+        rotation = item.rotation % 360
+        if rotation in (90, 270):
+            target_size = (new_size[1], new_size[0])
+        else:
+            target_size = new_size
+        crop_size = (right - left, bottom - top)
+        downsample = target_size[0] < crop_size[0] or target_size[1] < crop_size[1]
+        memory_limit = int(memory_limit_mb * 1024 * 1024)
+        
+        # Large or cropped images stored in strips or tiles are decoded band
+        # by band, reading only the strips inside the crop (plain files only)
+        tiled = (rotation in RIGHT_ANGLE_TRANSPOSES
+                 and not item.archive_member
+                 and tiled_reader.image_tiles(source) is not None
+                 and ((left, top, right, bottom) != (0, 0) + source.size
+                      or tiled_reader.decoded_bytes(source.size, source.mode) > memory_limit))
+        bilevel = source.mode == '1'
+        if tiled:
+            # Bilevel bands are resampled in grayscale; transparent sources
+            # keep their alpha channel
+            mode = ImageProcessor.native_mode(source.mode, 'transparency' in source.info)
+            if mode == '1':
+                mode = 'L'
+            try:
+                img = tiled_reader.resize_region(
+                    item.file_path, item.frame_index, source.size,
+                    (left, top, right, bottom),
+                    target_size if allow_upscale or downsample else None,
+                    memory_limit, REDUCING_GAP, mode
+                )
+            except Exception as e:
+                raise ValueError(f"Failed to load image {item.file_path}: {str(e)}")
+            finally:
+                source.close()
+            if rotation:
+                img = img.transpose(RIGHT_ANGLE_TRANSPOSES[rotation])
+            return (ImageProcessor.to_bilevel(img) if bilevel else img), placement
+        
+        # Decode no more pixels than the placed region needs
+        region_scale = min(new_size[0] / max(region_size[0], 1),
+                           new_size[1] / max(region_size[1], 1))
+        min_size = (source.width * region_scale, source.height * region_scale)
+        try:
+            img = ImageProcessor.decode_image(source, min_size, memory_limit)
+        except Exception as e:
+            raise ValueError(f"Failed to load image {item.file_path}: {str(e)}")
+        
+        if rotation not in RIGHT_ANGLE_TRANSPOSES:
+            # Arbitrary angles need a resampling rotate, applied step by step
             img = ImageProcessor.apply_crop(img, item.crop)
+            if img.mode == '1':
+                img = img.convert('L')
+            img = ImageProcessor.rotate_image(img, rotation)
+            if allow_upscale or new_size[0] < img.width or new_size[1] < img.height:
+                img = img.resize(new_size, Image.Resampling.LANCZOS)
+            return (ImageProcessor.to_bilevel(img) if bilevel else img), placement
         
-        # Apply rotation
-        if item.rotation != 0:
-            img = ImageProcessor.rotate_image(img, item.rotation)
+        # Crop and scale in a single resample, at the size before rotation
+        box = ImageProcessor.crop_box(img.size, item.crop)
+        box_size = (box[2] - box[0], box[3] - box[1])
         
-        # Calculate available space (page minus margins)
-        available_width = page_width - 2 * margin
-        available_height = page_height - 2 * margin
+        # Resize image (downsample only unless upscaling is allowed)
+        if allow_upscale or target_size[0] < box_size[0] or target_size[1] < box_size[1]:
+            if img.mode == '1':
+                # Pillow only resizes 1-bit images with nearest neighbour
+                img = img.crop(box).convert('L')
+                box = (0, 0, img.width, img.height)
+            img = img.resize(target_size, Image.Resampling.LANCZOS, box=box,
+                             reducing_gap=REDUCING_GAP)
+        elif box != (0, 0, img.width, img.height):
+            img = img.crop(box)
         
-        # Calculate scaled dimensions
-        if item.fit_to_page:
-            new_size = ImageProcessor.scale_to_fit(img, available_width, 
-                                                  available_height, item.scale)
-        else:
-            # Use original size with scale factor
-            new_size = (int(img.width * item.scale), int(img.height * item.scale))
+        # Right-angle rotation of the final pixels is lossless
+        if rotation:
+            img = img.transpose(RIGHT_ANGLE_TRANSPOSES[rotation])
         
-        # Resize image
-        img = img.resize(new_size, Image.Resampling.LANCZOS)
+        return (ImageProcessor.to_bilevel(img) if bilevel else img), placement
+    
+    @staticmethod
+    def process_image_item(item: ImageItem, page_width: float, page_height: float,
+                          margin: float, bg_color: Tuple[int, int, int],
+                          dpi: float = 72.0,
+                          memory_limit_mb: float = DEFAULT_MEMORY_LIMIT_MB) -> Image.Image:
+        """
+        Process an image item with all transformations applied.
+        
+        Args:
+            item: ImageItem with transformation parameters
+            page_width: Page width in points
+            page_height: Page height in points
+            margin: Margin in points
+            bg_color: Background color
+            dpi: Resolution of the resulting page image
+            memory_limit_mb: Memory ceiling for decoding the source
+        
+        Returns:
+            Processed PIL Image of the whole page
+        """
+        item = ImageProcessor.resolve_auto_trim(item, memory_limit_mb)
+        img, _ = ImageProcessor.render_image_region(
+            item, page_width, page_height, margin, dpi, allow_upscale=True,
+            memory_limit_mb=memory_limit_mb
+        )
         
-        # Place on background (convert page size to pixels for consistency)
-        # For PDF, we'll use 72 DPI, so points = pixels
+        # Place on background (convert page size to pixels at the requested DPI)
+        scale = dpi / 72.0
         result = ImageProcessor.place_on_background(
             img, 
-            int(page_width), 
-            int(page_height),
+            int(page_width * scale), 
+            int(page_height * scale),
             bg_color,
             item.position_x,
             item.position_y
@@ -6,6 +6,7 @@ advanced image manipulation capabilities.
 """
 
 import sys
+import multiprocessing
 from PyQt5.QtWidgets import QApplication
 from PyQt5.QtCore import Qt
 from main_window import MainWindow
@@ -13,6 +14,9 @@ from main_window import MainWindow
 
 def main():
     """Main entry point for the application."""
+    # Required for the export worker processes in frozen builds
+    multiprocessing.freeze_support()
+    
     # Enable high DPI scaling
     QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)
     QApplication.setAttribute(Qt.AA_UseHighDpiPixmaps, True)
@@ -4,15 +4,122 @@ Main window for the Image to PDF application.
 
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QHBoxLayout, QSplitter,
                             QMenuBar, QMenu, QAction, QFileDialog, QMessageBox,
-                            QToolBar, QStatusBar)
-from PyQt5.QtCore import Qt
+                            QToolBar, QStatusBar, QProgressDialog)
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
 from PyQt5.QtGui import QIcon
-from models import ProjectState
+from models import ExportReport, ProjectState
 from preview_widget import PreviewWidget
 from control_panel import ControlPanel
 from pdf_generator import PDFGenerator
 from pdf_merge_dialog import PDFMergeDialog
+from render_cache import RenderCache
+from export_journal import default_journal_dir, prune_journals
+import copy
 import os
+import time
+
+
+# Skipped pages listed by name after an export
+MAX_LISTED_FAILURES = 10
+
+
+class ExportWorker(QThread):
+    """Worker thread for PDF export to avoid blocking UI."""
+    
+    progress = pyqtSignal(int, int, float, float)  # current, total, pages/s, ETA seconds
+    finished = pyqtSignal(bool, bool, str)  # success, cancelled, message
+    
+    def __init__(self, output_path, images, page_config):
+        super().__init__()
+        self.output_path = output_path
+        # Work on a snapshot so edits made during the export don't affect it
+        self.images = copy.deepcopy(images)
+        self.page_config = copy.deepcopy(page_config)
+        self.cancelled = False
+        self.start_time = 0.0
+    
+    def cancel(self):
+        """Request cancellation; the export stops before the next page."""
+        self.cancelled = True
+    
+    def report_progress(self, current, total):
+        """Emit progress with throughput and estimated time remaining."""
+        elapsed = time.monotonic() - self.start_time
+        pages_per_second = current / elapsed if elapsed > 0 else 0.0
+        eta = (total - current) / pages_per_second if pages_per_second > 0 else 0.0
+        self.progress.emit(current, total, pages_per_second, eta)
+    
+    @staticmethod
+    def open_cache():
+        """Open the render cache; exports still work if it is unavailable."""
+        try:
+            return RenderCache()
+        except OSError as e:
+            print(f"Render cache unavailable: {str(e)}")
+            return None
+    
+    @staticmethod
+    def size_summary(report):
+        """Describe how the file compares to the target size, if one was set."""
+        if not report.target_size:
+            return ""
+        summary = (f"\n\nFile size: {report.file_size / (1024 * 1024):.2f} MB "
+                   f"(limit {report.target_size / (1024 * 1024):.2f} MB)")
+        if report.reduced_pages:
+            summary += f"\n{report.reduced_pages} of {len(report.pages)} pages exported at reduced quality"
+        if not report.fits:
+            summary += "\nThe file could not be made small enough."
+        return summary
+    
+    @staticmethod
+    def failure_summary(report):
+        """List the pages that were left out because they could not be rendered."""
+        if not report.failures:
+            return ""
+        lines = [f"\n\n{len(report.failures)} image(s) could not be read and were skipped:"]
+        for failure in report.failures[:MAX_LISTED_FAILURES]:
+            name = os.path.basename(failure.file_path)
+            if failure.archive_member:
+                name = f"{name}/{failure.archive_member}"
+            if failure.frame_index:
+                name = f"{name} [page {failure.frame_index + 1}]"
+            lines.append(f"Page {failure.index + 1}: {name}")
+        if len(report.failures) > MAX_LISTED_FAILURES:
+            lines.append("...")
+        return "\n".join(lines)
+    
+    def run(self):
+        """Run the export in background."""
+        self.start_time = time.monotonic()
+        try:
+            report = ExportReport()
+            journal_dir = default_journal_dir(self.output_path)
+            prune_journals(keep=journal_dir)
+            success = PDFGenerator.generate_pdf(
+                self.output_path,
+                self.images,
+                self.page_config,
+                workers=None,
+                progress_callback=self.report_progress,
+                cancel_check=lambda: self.cancelled,
+                cache=self.open_cache(),
+                report=report,
+                checkpoint_dir=journal_dir,
+                skip_errors=True
+            )
+            if self.cancelled:
+                self.finished.emit(False, True, "Export cancelled.")
+            elif success:
+                self.finished.emit(True, False, f"PDF saved successfully to:\n{self.output_path}"
+                                                f"{self.size_summary(report)}"
+                                                f"{self.failure_summary(report)}")
+            else:
+                self.finished.emit(False, False,
+                                   "Failed to generate PDF. Please check your images and try again.\n"
+                                   "Pages finished so far are kept; exporting to the same file "
+                                   "again resumes from them.")
+        except Exception as e:
+            self.finished.emit(False, False, f"An error occurred while exporting:\n{str(e)}")
 
 
 class MainWindow(QMainWindow):
@@ -21,6 +128,9 @@ class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.state = ProjectState()
+        self.export_worker = None
+        self.export_progress = None
+        self.export_actions = []
         self.init_ui()
         self.update_preview()
     
@@ -123,6 +233,7 @@ class MainWindow(QMainWindow):
         export_action.setShortcut("Ctrl+S")
         export_action.triggered.connect(self.export_pdf)
         file_menu.addAction(export_action)
+        self.export_actions.append(export_action)
         
         # Merge PDFs action
         merge_action = QAction("Merge PDFs...", self)
@@ -162,6 +273,7 @@ class MainWindow(QMainWindow):
         export_action = QAction("Export PDF", self)
         export_action.triggered.connect(self.export_pdf)
         toolbar.addAction(export_action)
+        self.export_actions.append(export_action)
         
         # Merge PDFs button
         merge_action = QAction("Merge PDFs", self)
@@ -238,38 +350,73 @@ class MainWindow(QMainWindow):
             "PDF Files (*.pdf)"
         )
         
-        if file_path:
-            # Ensure .pdf extension
-            if not file_path.lower().endswith('.pdf'):
-                file_path += '.pdf'
-            
-            try:
-                # Generate PDF
-                success = PDFGenerator.generate_pdf(
-                    file_path,
-                    self.state.images,
-                    self.state.page_config
-                )
-                
-                if success:
-                    QMessageBox.information(
-                        self,
-                        "Success",
-                        f"PDF saved successfully to:\n{file_path}"
-                    )
-                    self.status_bar.showMessage(f"PDF exported to {os.path.basename(file_path)}")
-                else:
-                    QMessageBox.warning(
-                        self,
-                        "Export Failed",
-                        "Failed to generate PDF. Please check your images and try again."
-                    )
-            except Exception as e:
-                QMessageBox.critical(
-                    self,
-                    "Error",
-                    f"An error occurred while exporting:\n{str(e)}"
-                )
+        if not file_path:
+            return
+        
+        # Ensure .pdf extension
+        if not file_path.lower().endswith('.pdf'):
+            file_path += '.pdf'
+        
+        total = len(self.state.images)
+        
+        # Non-modal progress dialog keeps the preview usable during export
+        self.export_progress = QProgressDialog("Exporting PDF...", "Cancel", 0, total, self)
+        self.export_progress.setWindowTitle("Export PDF")
+        self.export_progress.setWindowModality(Qt.NonModal)
+        self.export_progress.setAutoClose(False)
+        self.export_progress.setAutoReset(False)
+        self.export_progress.setMinimumDuration(0)
+        
+        # Create and start worker thread
+        self.export_worker = ExportWorker(file_path, self.state.images, self.state.page_config)
+        self.export_worker.progress.connect(self.on_export_progress)
+        self.export_worker.finished.connect(
+            lambda success, cancelled, msg: self.on_export_finished(success, cancelled, msg, file_path)
+        )
+        
+        # Handle cancel
+        self.export_progress.canceled.connect(self.export_worker.cancel)
+        
+        for action in self.export_actions:
+            action.setEnabled(False)
+        
+        self.export_worker.start()
+        self.export_progress.show()
+        self.status_bar.showMessage(f"Exporting {total} pages...")
+    
+    def on_export_progress(self, current, total, pages_per_second, eta):
+        """Update export progress."""
+        message = (f"Exporting page {current} of {total}\n"
+                   f"{pages_per_second:.1f} pages/s, about {int(eta)} s remaining")
+        if self.export_progress is not None:
+            self.export_progress.setValue(current)
+            self.export_progress.setLabelText(message)
+        self.status_bar.showMessage(message.replace("\n", " - "))
+    
+    def on_export_finished(self, success, cancelled, message, file_path):
+        """Handle export completion."""
+        if self.export_progress is not None:
+            self.export_progress.close()
+            self.export_progress = None
+        
+        for action in self.export_actions:
+            action.setEnabled(True)
+        
+        if success:
+            QMessageBox.information(self, "Success", message)
+            self.status_bar.showMessage(f"PDF exported to {os.path.basename(file_path)}")
+        elif cancelled:
+            self.status_bar.showMessage("Export cancelled")
+        else:
+            QMessageBox.warning(self, "Export Failed", message)
+            self.status_bar.showMessage("Export failed")
+    
+    def closeEvent(self, event):
+        """Stop a running export before the window closes."""
+        if self.export_worker is not None and self.export_worker.isRunning():
+            self.export_worker.cancel()
+            self.export_worker.wait()
+        super().closeEvent(event)
     
     def show_merge_dialog(self):
         """Show the PDF merge dialog."""
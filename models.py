@@ -3,7 +3,7 @@ Data models for the application.
 """
 
 from dataclasses import dataclass, field
-from typing import Tuple, Optional
+from typing import List, Tuple, Optional
 from PyQt5.QtGui import QColor
 
 
@@ -16,6 +16,16 @@ class CropRect:
     height: float = 1.0
 
 
+@dataclass
+class RawFormat:
+    """Layout of the frames in a raw (headerless) pixel dump."""
+    width: int  # Frame width in pixels
+    height: int  # Frame height in pixels
+    mode: str = 'L'  # Pixel layout: 'L', 'RGB', 'RGBA' or 'I;16' (16-bit little-endian gray)
+    stride: int = 0  # Bytes per row; 0 means rows are packed without padding
+    offset: int = 0  # Bytes before the first frame, e.g. a camera header
+
+
 @dataclass
 class ImageItem:
     """Represents an image with its transformation parameters."""
@@ -26,6 +36,25 @@ class ImageItem:
     rotation: int = 0  # Rotation in degrees (0, 90, 180, 270)
     crop: CropRect = field(default_factory=CropRect)
     fit_to_page: bool = True  # If True, scale to fit page while maintaining aspect ratio
+    frame_index: int = 0  # Frame of a multi-page TIFF or animated GIF/WebP
+    auto_trim: bool = False  # Crop away uniform borders (blank margins, scanner bed)
+    trim_tolerance: int = 32  # Largest colour difference from the border that is still border
+    raw_format: Optional[RawFormat] = None  # Frame layout of a raw pixel dump (see raw_reader)
+    archive_member: str = ''  # Member of the ZIP/TAR archive at file_path, if any (see archive_reader)
+
+
+@dataclass
+class Overlay:
+    """Text or image drawn on top of every exported page (header, footer, watermark)."""
+    text: str = ''  # Text to draw; {page} and {pages} become the page number and count
+    image_path: str = ''  # Image to draw instead of text, e.g. a logo
+    x: float = 0.5  # Normalized X position of the overlay's centre (0-1)
+    y: float = 0.5  # Normalized Y position of the overlay's centre (0-1, from the top)
+    width: float = 0.2  # Width of an image overlay, relative to the page width
+    font_size: float = 10.0  # Text size in points
+    color: Tuple[int, int, int] = (0, 0, 0)  # Text colour (RGB)
+    opacity: float = 1.0  # 0 = invisible, 1 = opaque
+    rotation: float = 0.0  # Counter-clockwise rotation in degrees
 
 
 @dataclass
@@ -34,6 +63,61 @@ class PageConfig:
     format_name: str = 'A4'
     background_color: Tuple[int, int, int] = (255, 255, 255)  # RGB
     margin: float = 36.0  # Margin in points (0.5 inch)
+    embed_source_images: bool = True  # Embed JPEG/JPEG 2000 sources without re-encoding
+    encoder: str = 'auto'  # Page image encoder: 'auto', 'flate', 'jpeg' or 'raw'
+    jpeg_quality: int = 85  # Quality for the 'jpeg' encoder and photos with 'auto' (1-95)
+    flate_level: int = 6  # zlib compression level for the 'flate' encoder (0-9)
+    target_dpi: float = 150.0  # Raster resolution of exported images (never upscaled)
+    preview_dpi: float = 72.0  # Raster resolution of the on-screen preview
+    deduplicate: bool = True  # Render repeated pages once and share their image
+    memory_limit_mb: int = 1024  # Memory ceiling for decoding one source image (per worker)
+    optimization: str = 'none'  # Post-save optimization level (see pdf_optimizer)
+    target_size_mb: float = 0.0  # Lower quality and DPI until the file fits this size (0 = off)
+    overlays: List[Overlay] = field(default_factory=list)  # Drawn once and shared by all pages
+
+
+@dataclass
+class PageReport:
+    """Settings and size a page was exported with."""
+    index: int  # Page number (0-based)
+    file_path: str  # Source image file
+    encoding: str  # PDF filter of the page image, or 'none' if it is unencoded
+    image_bytes: int  # Encoded image size (0 when an earlier identical page is reused)
+    target_dpi: float  # Raster resolution the page was rendered at
+    jpeg_quality: int  # JPEG quality the page was rendered with
+    level: int = 0  # Quality level chosen to meet a target size (0 = as configured)
+    archive_member: str = ''  # Member of the archive at file_path, if any
+    frame_index: int = 0  # Frame of a multi-page source file
+
+
+@dataclass
+class PageFailure:
+    """A page that was left out because its image could not be rendered."""
+    index: int  # Page number (0-based)
+    file_path: str  # Source image file
+    error: str  # Error message
+    archive_member: str = ''  # Member of the archive at file_path, if any
+    frame_index: int = 0  # Frame of a multi-page source file
+
+
+@dataclass
+class ExportReport:
+    """Outcome of an export, filled in by PDFGenerator.generate_pdf."""
+    pages: List[PageReport] = field(default_factory=list)
+    failures: List[PageFailure] = field(default_factory=list)  # Pages skipped after errors
+    file_size: int = 0  # Size of the written file in bytes
+    target_size: int = 0  # Requested maximum file size in bytes (0 = none)
+    resumed_pages: int = 0  # Pages taken from the checkpoint journal of an earlier run
+    
+    @property
+    def fits(self) -> bool:
+        """Whether the file is within the target size."""
+        return not self.target_size or self.file_size <= self.target_size
+    
+    @property
+    def reduced_pages(self) -> int:
+        """Number of pages exported below the configured quality."""
+        return sum(1 for page in self.pages if page.level > 0)
 
 
 @dataclass
@@ -0,0 +1,167 @@
+"""
+Headers, footers, watermarks and page numbers drawn on exported pages.
+
+Overlays are vector content on top of the page image, never part of the
+raster. Everything that is the same on every page is drawn once into a
+form XObject that each page references with a single operator; only
+text containing {page} or {pages} is written per page, as a few bytes of
+text operators.
+
+Text uses the standard Helvetica font, which needs no embedding but only
+covers the Windows-1252 character set.
+"""
+
+import math
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from PIL import Image
+import fitz  # PyMuPDF
+from models import Overlay, PageConfig
+from image_processor import DEFAULT_MEMORY_LIMIT_MB, ImageProcessor
+from page_renderer import PageImage, encode_image
+from pdf_stream_writer import format_array, format_number
+import tiled_reader
+
+
+# Resource names used by overlay content
+FONT_NAME = 'F1'
+FORM_NAME = 'Ov'
+
+# PDF font dictionary of the overlay font
+FONT_DICTIONARY = '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>'
+
+# Distance from the text baseline to the overlay's centre, in font sizes
+BASELINE_OFFSET = 0.35
+
+_PAGE_FIELDS = ('{page}', '{pages}')
+
+
+@dataclass
+class OverlayContent:
+    """Content stream operators of some overlays, with the resources they use."""
+    operators: bytes
+    images: Dict[str, PageImage] = field(default_factory=dict)  # Resource name -> image
+    opacities: Dict[str, float] = field(default_factory=dict)  # ExtGState name -> opacity
+    uses_font: bool = False
+
+
+def is_per_page(overlay: Overlay) -> bool:
+    """Check whether an overlay changes from page to page."""
+    return not overlay.image_path and any(name in overlay.text for name in _PAGE_FIELDS)
+
+
+def overlay_text(overlay: Overlay, page_number: int = 0, page_count: int = 0) -> str:
+    """Fill in the page fields of an overlay's text, limited to the font's characters."""
+    text = overlay.text.replace('{page}', str(page_number)).replace('{pages}', str(page_count))
+    return text.encode('cp1252', 'replace').decode('cp1252')
+
+
+def text_width(text: str, font_size: float) -> float:
+    """Width of a text in the overlay font, in points."""
+    return fitz.get_text_length(text, fontname='helv', fontsize=font_size)
+
+
+def anchor_matrix(overlay: Overlay, page_width: float, page_height: float) -> Tuple[float, ...]:
+    """
+    Matrix that moves the origin to the overlay's centre and applies its rotation.
+    
+    Returns:
+        Matrix (a, b, c, d, e, f) in PDF coordinates (bottom-left origin)
+    """
+    angle = math.radians(overlay.rotation)
+    cos_a, sin_a = math.cos(angle), math.sin(angle)
+    return (cos_a, sin_a, -sin_a, cos_a,
+            overlay.x * page_width, (1 - overlay.y) * page_height)
+
+
+def load_overlay_image(file_path: str) -> PageImage:
+    """
+    Load and encode an overlay image losslessly.
+    
+    Transparent areas stay transparent, through a soft mask.
+    """
+    with Image.open(file_path) as img:
+        tiled_reader.check_memory(img.size, img.mode, DEFAULT_MEMORY_LIMIT_MB * 1024 * 1024)
+        img.load()
+        mode = ImageProcessor.native_mode(img.mode, 'transparency' in img.info)
+        if img.mode != mode:
+            img = img.convert(mode)
+        return encode_image(img, PageConfig(encoder='flate'))
+
+
+def _escape(text: str) -> str:
+    """Escape a text for a PDF literal string."""
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _build(overlays: List[Overlay], page_width: float, page_height: float,
+           texts: List[str], images: Dict[int, PageImage]) -> OverlayContent:
+    """Build the operators of overlays whose texts and images are already resolved."""
+    content = OverlayContent(b'')
+    ops = []
+    for index, (overlay, text) in enumerate(zip(overlays, texts)):
+        ops.append('q')
+        ops.append('%s cm' % format_array(anchor_matrix(overlay, page_width, page_height))[1:-1])
+        if overlay.opacity < 1:
+            state = 'GS%d' % len(content.opacities)
+            content.opacities[state] = max(0.0, overlay.opacity)
+            ops.append('/%s gs' % state)
+        
+        image = images.get(index)
+        if image is not None:
+            width = overlay.width * page_width
+            height = width * image.height / image.width
+            name = 'OvIm%d' % len(content.images)
+            content.images[name] = image
+            ops.append('%s cm /%s Do' % (
+                format_array((width, 0, 0, height, -width / 2, -height / 2))[1:-1], name))
+        else:
+            content.uses_font = True
+            r, g, b = overlay.color
+            ops.append('BT /%s %s Tf %s %s %s rg %s %s Td (%s) Tj ET' % (
+                FONT_NAME, format_number(overlay.font_size),
+                format_number(r / 255), format_number(g / 255), format_number(b / 255),
+                format_number(-text_width(text, overlay.font_size) / 2),
+                format_number(-BASELINE_OFFSET * overlay.font_size),
+                _escape(text)))
+        ops.append('Q')
+    content.operators = '\n'.join(ops).encode('cp1252')
+    return content
+
+
+def static_content(overlays: List[Overlay], page_width: float,
+                   page_height: float) -> Optional[OverlayContent]:
+    """
+    Build the content of the overlays that are the same on every page.
+    
+    Returns:
+        OverlayContent for a form XObject, or None if there are no such overlays
+    """
+    selected = [overlay for overlay in overlays if not is_per_page(overlay)]
+    if not selected:
+        return None
+    images = {index: load_overlay_image(overlay.image_path)
+              for index, overlay in enumerate(selected) if overlay.image_path}
+    texts = [overlay_text(overlay) for overlay in selected]
+    return _build(selected, page_width, page_height, texts, images)
+
+
+def page_content(overlays: List[Overlay], page_width: float, page_height: float,
+                 page_number: int, page_count: int) -> Optional[OverlayContent]:
+    """
+    Build the content of the overlays that show the page number.
+    
+    Returns:
+        OverlayContent for one page, or None if there are no such overlays
+    """
+    selected = [overlay for overlay in overlays if is_per_page(overlay)]
+    if not selected:
+        return None
+    texts = [overlay_text(overlay, page_number, page_count) for overlay in selected]
+    return _build(selected, page_width, page_height, texts, {})
+
+
+def opacity_entries(content: OverlayContent) -> str:
+    """Format the ExtGState resources of overlay content."""
+    return ' '.join('/%s << /ca %s /CA %s >>' % (name, format_number(value), format_number(value))
+                    for name, value in content.opacities.items())
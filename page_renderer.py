@@ -0,0 +1,470 @@
+"""
+Page rendering module: turns an ImageItem into image data plus the
+instructions needed to place it on a PDF page.
+"""
+
+from dataclasses import asdict, dataclass, replace
+from PIL import Image, features
+from typing import Dict, Optional, Tuple, Union
+from models import ImageItem, PageConfig
+from page_formats import get_page_size
+from image_processor import BILEVEL_LUT, ImageProcessor
+from image_analysis import choose_encoding
+import archive_reader
+import tiled_reader
+import hashlib
+import io
+import os
+import zlib
+
+
+# Source formats whose compressed data can be embedded in a PDF as-is
+PASSTHROUGH_FILTERS = {
+    'JPEG': 'DCTDecode',
+    'JPEG2000': 'JPXDecode',
+    # Multi-picture JPEG (phone photos with a preview or gain map); the
+    # first picture is a baseline JPEG stream of its own
+    'MPO': 'DCTDecode',
+}
+
+# Bump when a change to rendering alters the output for the same inputs,
+# so cached pages from older versions are not reused
+RENDER_VERSION = 9
+
+# Encoders available for rendered page images. 'auto' picks JPEG, Flate,
+# an indexed palette or bilevel per page (see image_analysis). Bilevel
+# images always use CCITT G4 (or 1-bit Flate without libtiff) unless 'raw'
+# is selected.
+PAGE_ENCODERS = ('auto', 'flate', 'jpeg', 'raw')
+
+# PDF colour spaces for the image modes that can be embedded directly
+COLOR_SPACES = {
+    'RGB': 'DeviceRGB',
+    'L': 'DeviceGray',
+    '1': 'DeviceGray',
+}
+
+# Modes with an alpha channel, and the mode of their colour channels
+ALPHA_MODES = {
+    'RGBA': 'RGB',
+    'LA': 'L',
+}
+
+# Settings that only affect the saved file, not the rendered pages
+_FILE_ONLY_SETTINGS = ('optimization', 'target_size_mb', 'overlays')
+
+_MP_ENTRY = 0xB002
+
+_JPEG_SOI = b'\xff\xd8'
+_JPEG_EOI = b'\xff\xd9'
+
+_TIFF_STRIP_OFFSETS = 273
+_TIFF_ROWS_PER_STRIP = 278
+_TIFF_STRIP_BYTE_COUNTS = 279
+
+
+@dataclass
+class PageImage:
+    """An encoded image ready to be embedded as a PDF image XObject."""
+    width: int  # Width in pixels
+    height: int  # Height in pixels
+    color_space: str  # PDF colour space name, e.g. 'DeviceRGB'
+    bits_per_component: int
+    filters: Tuple[str, ...]  # PDF filter names, e.g. ('DCTDecode',)
+    data: bytes  # Encoded stream data
+    digest: str = ''  # Content hash, used to name the XObject
+    # Parameters of the (single) filter, e.g. {'K': -1} for CCITTFaxDecode
+    decode_parms: Optional[Dict[str, Union[int, bool]]] = None
+    # RGB triples of an indexed colour space over color_space, if any
+    palette: bytes = b''
+    # Soft mask (DeviceGray alpha) of a transparent image, if any
+    smask: Optional['PageImage'] = None
+    # The data is the source file's, embedded unchanged (see _source_page)
+    passthrough: bool = False
+    
+    def __post_init__(self):
+        if not self.digest:
+            digest = hashlib.sha1(self.data)
+            digest.update(self.palette)
+            digest.update(repr((self.width, self.height, self.color_space,
+                                self.bits_per_component, self.decode_parms)).encode('ascii'))
+            if self.smask is not None:
+                digest.update(self.smask.digest.encode('ascii'))
+            self.digest = digest.hexdigest()
+    
+    @property
+    def encoded_size(self) -> int:
+        """Bytes of stream data of the image and its soft mask."""
+        return len(self.data) + (len(self.smask.data) if self.smask is not None else 0)
+
+
+@dataclass
+class RenderedPage:
+    """A page ready to be drawn: an image and its placement in PDF space."""
+    image: PageImage
+    # Transformation matrix (a, b, c, d, e, f) mapping the unit square onto the page
+    matrix: Tuple[float, float, float, float, float, float] = (1, 0, 0, 1, 0, 0)
+    clip: Optional[Tuple[float, float, float, float]] = None  # x, y, width, height in points
+    background: Optional[Tuple[int, int, int]] = None  # Vector background fill (RGB)
+    
+    def without_image_data(self) -> 'RenderedPage':
+        """
+        Return a copy that refers to the already embedded image by digest only.
+        
+        Backends look images up by digest before they read the data, so the
+        copy can be drawn again after the original page has been added.
+        """
+        smask = self.image.smask
+        if smask is not None:
+            smask = replace(smask, data=b'')
+        return replace(self, image=replace(self.image, data=b'', smask=smask))
+
+
+def file_digest(file_path: str) -> str:
+    """Return the SHA-1 hex digest of a file's contents."""
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def page_key(item: ImageItem, page_config: PageConfig,
+             source_digests: Optional[Dict[str, str]] = None) -> str:
+    """
+    Return a key that identifies the rendered output of a page.
+    
+    Two pages with the same key render to the same image and placement:
+    the key covers the source file's contents and every ImageItem and
+    PageConfig field.
+    
+    Args:
+        item: ImageItem with transformation parameters
+        page_config: Page configuration
+        source_digests: Optional cache of file path -> content digest
+    
+    Returns:
+        Hex digest string
+    """
+    if source_digests is None:
+        source_digests = {}
+    # Archive members are keyed by their own contents, not the whole archive's
+    source_path = item.file_path
+    if item.archive_member:
+        source_path = os.path.join(item.file_path, item.archive_member)
+    source = source_digests.get(source_path)
+    if source is None:
+        if item.archive_member:
+            source = archive_reader.member_digest(item.file_path, item.archive_member)
+        else:
+            source = file_digest(item.file_path)
+        source_digests[source_path] = source
+    
+    params = asdict(item)
+    params.pop('file_path')
+    config = asdict(page_config)
+    for name in _FILE_ONLY_SETTINGS:
+        config.pop(name)
+    key_data = repr((RENDER_VERSION, source, sorted(params.items()),
+                     sorted(config.items())))
+    return hashlib.sha1(key_data.encode('utf-8')).hexdigest()
+
+
+def _unit_rotation(angle: int) -> Tuple[int, int]:
+    """Return exact (cos, sin) for a multiple of 90 degrees."""
+    return {0: (1, 0), 90: (0, 1), 180: (-1, 0), 270: (0, -1)}[angle % 360]
+
+
+def _clamped_crop(item: ImageItem) -> Tuple[float, float, float, float]:
+    """Return the crop as normalized (left, top, right, bottom), clamped like apply_crop."""
+    crop = item.crop
+    left = max(0.0, min(crop.x, 1.0))
+    top = max(0.0, min(crop.y, 1.0))
+    right = max(left, min(crop.x + crop.width, 1.0))
+    bottom = max(top, min(crop.y + crop.height, 1.0))
+    return (left, top, right, bottom)
+
+
+def place_image(item: ImageItem, src_width: float, src_height: float,
+                page_width: float, page_height: float,
+                margin: float) -> Tuple[Tuple[float, ...], Tuple[float, ...]]:
+    """
+    Express crop, rotation, scale and position of an item as PDF operators.
+    
+    Args:
+        item: ImageItem with transformation parameters
+        src_width: Width of the full source image in pixels
+        src_height: Height of the full source image in pixels
+        page_width: Page width in points
+        page_height: Page height in points
+        margin: Margin in points
+    
+    Returns:
+        Tuple of (matrix, clip): the matrix maps the unit square onto the
+        full source image, the clip rectangle (x, y, width, height) is the
+        visible crop region, both in PDF coordinates (bottom-left origin)
+    """
+    left, top, right, bottom = _clamped_crop(item)
+    crop_width = (right - left) * src_width
+    crop_height = (bottom - top) * src_height
+    
+    rotation = item.rotation % 360
+    if rotation in (90, 270):
+        rotated_size = (crop_height, crop_width)
+    else:
+        rotated_size = (crop_width, crop_height)
+    
+    x, y, width, height = ImageProcessor.compute_placement(
+        rotated_size, item, page_width, page_height, margin
+    )
+    # PDF space has its origin at the bottom-left corner
+    y = page_height - y - height
+    
+    # Size of the crop region before rotation, and of the full image around it
+    if rotation in (90, 270):
+        local_width, local_height = height, width
+    else:
+        local_width, local_height = width, height
+    full_width = local_width / (right - left)
+    full_height = local_height / (bottom - top)
+    
+    # Lower-left corner of the full image, relative to the crop centre
+    image_x = -local_width / 2 - left * full_width
+    image_y = local_height / 2 + top * full_height - full_height
+    
+    # Rotate clockwise around the centre of the placed rectangle
+    cos_a, sin_a = _unit_rotation(-rotation)
+    center_x = x + width / 2
+    center_y = y + height / 2
+    matrix = (
+        full_width * cos_a,
+        full_width * sin_a,
+        -full_height * sin_a,
+        full_height * cos_a,
+        image_x * cos_a - image_y * sin_a + center_x,
+        image_x * sin_a + image_y * cos_a + center_y,
+    )
+    return matrix, (x, y, width, height)
+
+
+def encode_image(img: Image.Image, page_config: PageConfig) -> PageImage:
+    """
+    Encode a PIL image with the encoder selected in the page configuration.
+    
+    The result goes straight into the PDF, without an intermediate
+    image file format. The 'auto' encoder analyses each image first and
+    may reduce it to grayscale, a palette or black and white. The alpha
+    channel of a transparent image becomes a soft mask; fully opaque
+    images lose their alpha channel instead.
+    
+    Args:
+        img: Image to encode
+        page_config: Page configuration (encoder and its settings)
+    
+    Returns:
+        PageImage holding the encoded stream
+    """
+    if img.mode in ALPHA_MODES:
+        alpha = img.getchannel('A')
+        img = img.convert(ALPHA_MODES[img.mode])
+        if alpha.getextrema() != (255, 255):
+            image = encode_image(img, page_config)
+            return replace(image, smask=_encode_mask(alpha, page_config), digest='')
+    
+    encoder = page_config.encoder
+    if encoder == 'auto':
+        img, encoder = choose_encoding(img)
+    
+    if img.mode == '1':
+        return _encode_bilevel(img, page_config)
+    if img.mode == 'P' and encoder != 'jpeg':
+        return _encode_indexed(img, encoder, page_config)
+    if img.mode not in COLOR_SPACES:
+        img = img.convert('RGB')
+    color_space = COLOR_SPACES[img.mode]
+    
+    if encoder == 'jpeg':
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG', quality=page_config.jpeg_quality)
+        data = buffer.getvalue()
+        filters = ('DCTDecode',)
+    elif encoder == 'flate':
+        data = zlib.compress(img.tobytes(), page_config.flate_level)
+        filters = ('FlateDecode',)
+    elif encoder == 'raw':
+        data = img.tobytes()
+        filters = ()
+    else:
+        raise ValueError(f"Unknown page encoder: {encoder}")
+    
+    return PageImage(img.width, img.height, color_space, 8, filters, data)
+
+
+def _encode_indexed(img: Image.Image, encoder: str, page_config: PageConfig) -> PageImage:
+    """Encode a palette image with an indexed colour space, packing small palettes."""
+    palette = img.getpalette() or []
+    colors = max(1, len(palette) // 3)
+    bits = next(b for b in (1, 2, 4, 8) if colors <= 1 << b)
+    
+    # Pillow packs palette indices like PDF does for 1, 2 and 4 bits per component
+    data = img.tobytes('raw', 'P' if bits == 8 else 'P;%d' % bits)
+    filters = ()
+    if encoder != 'raw':
+        data = zlib.compress(data, page_config.flate_level)
+        filters = ('FlateDecode',)
+    return PageImage(img.width, img.height, 'DeviceRGB', bits, filters, data,
+                     palette=bytes(palette[:colors * 3]))
+
+
+def _encode_mask(alpha: Image.Image, page_config: PageConfig) -> PageImage:
+    """
+    Encode an alpha channel as a soft mask.
+    
+    Masks are always lossless, so edges stay sharp; masks that are only
+    fully transparent or fully opaque are packed to 1 bit per pixel.
+    """
+    bits = 8
+    if set(alpha.histogram()[1:255]) == {0}:
+        alpha = alpha.point(BILEVEL_LUT, '1')
+        bits = 1
+    data = alpha.tobytes()
+    if page_config.encoder == 'raw':
+        return PageImage(alpha.width, alpha.height, 'DeviceGray', bits, (), data)
+    return PageImage(alpha.width, alpha.height, 'DeviceGray', bits, ('FlateDecode',),
+                     zlib.compress(data, page_config.flate_level))
+
+
+def _ccitt_g4(img: Image.Image) -> Optional[bytes]:
+    """
+    Compress a bilevel image with CCITT Group 4 through Pillow's libtiff writer.
+    
+    Returns:
+        The raw G4 data, or None if libtiff is not available
+    """
+    if not features.check('libtiff'):
+        return None
+    
+    # A single strip holds exactly the data a CCITTFaxDecode stream needs
+    buffer = io.BytesIO()
+    img.save(buffer, format='TIFF', compression='group4',
+             tiffinfo={_TIFF_ROWS_PER_STRIP: img.height})
+    with Image.open(buffer) as tiff:
+        offsets = tiff.tag_v2.get(_TIFF_STRIP_OFFSETS)
+        byte_counts = tiff.tag_v2.get(_TIFF_STRIP_BYTE_COUNTS)
+    if not offsets or len(offsets) != 1:
+        return None
+    return buffer.getvalue()[offsets[0]:offsets[0] + byte_counts[0]]
+
+
+def _encode_bilevel(img: Image.Image, page_config: PageConfig) -> PageImage:
+    """Encode a 1-bit image, using CCITT G4 unless the 'raw' encoder is selected."""
+    if page_config.encoder != 'raw':
+        data = _ccitt_g4(img)
+        if data is not None:
+            # Pillow's 0 (black) bits are coded as white runs, hence BlackIs1
+            return PageImage(img.width, img.height, 'DeviceGray', 1, ('CCITTFaxDecode',), data,
+                             decode_parms={'K': -1, 'Columns': img.width,
+                                           'Rows': img.height, 'BlackIs1': True})
+    
+    # Pillow packs 1-bit rows exactly like PDF does, with 1 meaning white
+    data = img.tobytes()
+    if page_config.encoder == 'raw':
+        return PageImage(img.width, img.height, 'DeviceGray', 1, (), data)
+    return PageImage(img.width, img.height, 'DeviceGray', 1, ('FlateDecode',),
+                     zlib.compress(data, page_config.flate_level))
+
+
+def _source_page(item: ImageItem, page_config: PageConfig) -> Optional[RenderedPage]:
+    """
+    Build a page that embeds the source file's compressed data unchanged.
+    
+    Returns:
+        RenderedPage, or None if the source cannot be embedded as-is
+    """
+    # Only single-image files can be embedded as they are
+    if item.frame_index != 0:
+        return None
+    
+    # Archive members are read into memory to be decoded anyway, so the
+    # same bytes are embedded instead of reading the member again
+    data = None
+    if item.archive_member:
+        data = archive_reader.read_member(item.file_path, item.archive_member)
+        source = tiled_reader.open_image(io.BytesIO(data))
+    else:
+        source = ImageProcessor.open_image(item.file_path, 0, item.raw_format)
+    with source as img:
+        filter_name = PASSTHROUGH_FILTERS.get(img.format)
+        color_space = COLOR_SPACES.get(img.mode)
+        src_width, src_height = img.size
+        length = None
+        if img.format == 'MPO':
+            # Only the first picture is embedded; the MP index gives its size
+            try:
+                length = img.mpinfo[_MP_ENTRY][0]['Size']
+            except (AttributeError, KeyError, IndexError, TypeError):
+                return None
+    
+    if filter_name is None or color_space is None:
+        return None
+    
+    left, top, right, bottom = _clamped_crop(item)
+    if right <= left or bottom <= top or item.rotation % 90 != 0:
+        return None
+    
+    if data is None:
+        with open(item.file_path, 'rb') as f:
+            data = f.read()
+    if length is not None:
+        data = data[:length]
+    # Passthrough data is never decoded here, so catch truncated files
+    # before they are embedded; some writers pad after the end marker
+    if filter_name == 'DCTDecode' and not (
+            data.startswith(_JPEG_SOI) and data.rstrip(b'\x00\r\n\t ').endswith(_JPEG_EOI)):
+        raise ValueError(f"Truncated or corrupt JPEG data in {item.file_path}")
+    
+    page_size = get_page_size(page_config.format_name)
+    matrix, clip = place_image(item, src_width, src_height,
+                               page_size.width, page_size.height,
+                               page_config.margin)
+    
+    image = PageImage(src_width, src_height, color_space, 8, (filter_name,), data,
+                      passthrough=True)
+    return RenderedPage(image=image, matrix=matrix, clip=clip,
+                        background=page_config.background_color)
+
+
+def render_page(item: ImageItem, page_config: PageConfig) -> RenderedPage:
+    """
+    Render one page of the document.
+    
+    Defined at module level so it can be pickled into worker processes.
+    
+    Args:
+        item: ImageItem with transformation parameters
+        page_config: Page configuration
+    
+    Returns:
+        RenderedPage ready to be drawn
+    """
+    item = ImageProcessor.resolve_auto_trim(item, page_config.memory_limit_mb)
+    if page_config.embed_source_images:
+        page = _source_page(item, page_config)
+        if page is not None:
+            return page
+    
+    page_size = get_page_size(page_config.format_name)
+    img, (x, y, width, height) = ImageProcessor.render_image_region(
+        item,
+        page_size.width,
+        page_size.height,
+        page_config.margin,
+        page_config.target_dpi,
+        memory_limit_mb=page_config.memory_limit_mb
+    )
+    
+    # The background is a vector fill, so only the image region is encoded
+    y = page_size.height - y - height
+    return RenderedPage(image=encode_image(img, page_config),
+                        matrix=(width, 0, 0, height, x, y),
+                        background=page_config.background_color)
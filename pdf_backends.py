@@ -0,0 +1,376 @@
+"""
+PDF output backends.
+
+Each backend turns a sequence of RenderedPage objects into a PDF file:
+
+- reportlab: builds the document with a reportlab canvas, which keeps all
+  page data in memory until the document is saved
+- stream: writes every page to the output as soon as it is added, so
+  memory use stays constant regardless of the page count
+- fitz: builds the document with PyMuPDF, writing the same image streams
+  and content operators as the stream backend
+
+reportlab is optional: builds that leave it out fall back to fitz.
+"""
+
+import fitz  # PyMuPDF
+import os
+from typing import Dict, List, Optional
+from models import Overlay
+from overlays import (FONT_DICTIONARY, FONT_NAME, FORM_NAME, OverlayContent,
+                      opacity_entries, page_content, static_content)
+from page_renderer import PageImage, RenderedPage
+from pdf_stream_writer import PDFStreamWriter, format_array, format_dictionary, format_number
+
+
+def color_space_entry(image: PageImage) -> str:
+    """Format the colour space of an image, including an indexed palette."""
+    if not image.palette:
+        return '/' + image.color_space
+    return '[/Indexed /%s %d <%s>]' % (image.color_space, len(image.palette) // 3 - 1,
+                                       image.palette.hex())
+
+
+def image_dictionary(image: PageImage, smask: Optional[str] = None) -> str:
+    """
+    Build the stream dictionary entries of an image XObject (without /Length).
+    
+    Args:
+        image: Encoded image
+        smask: Reference of the image's soft mask, if it has one
+    """
+    entries = [
+        '/Type /XObject /Subtype /Image',
+        '/Width %d /Height %d' % (image.width, image.height),
+        '/ColorSpace %s' % color_space_entry(image),
+        '/BitsPerComponent %d' % image.bits_per_component,
+    ]
+    if image.filters:
+        entries.append('/Filter [%s]' % ' '.join('/' + f for f in image.filters))
+    if image.decode_parms:
+        entries.append('/DecodeParms [%s]' % format_dictionary(image.decode_parms))
+    if smask is not None:
+        entries.append('/SMask %s' % smask)
+    return ' '.join(entries)
+
+
+def page_operators(page: RenderedPage, page_width: float, page_height: float,
+                   image_name: str) -> bytes:
+    """
+    Build the content stream operators that draw a rendered page.
+    
+    Args:
+        page: Page to draw
+        page_width: Page width in points
+        page_height: Page height in points
+        image_name: Resource name of the page image XObject
+    
+    Returns:
+        Content stream data
+    """
+    ops = []
+    if page.background is not None:
+        r, g, b = page.background
+        ops.append('q %s %s %s rg 0 0 %s %s re f Q' % (
+            format_number(r / 255), format_number(g / 255), format_number(b / 255),
+            format_number(page_width), format_number(page_height)))
+    
+    ops.append('q')
+    if page.clip is not None:
+        ops.append('%s re W n' % format_array(page.clip)[1:-1])
+    ops.append('%s cm' % format_array(page.matrix)[1:-1])
+    ops.append('/%s Do' % image_name)
+    ops.append('Q')
+    return '\n'.join(ops).encode('latin-1')
+
+
+def form_dictionary(width: float, height: float, resources: str) -> str:
+    """Build the stream dictionary entries of a page-sized form XObject."""
+    return '/Type /XObject /Subtype /Form /BBox [0 0 %s %s] /Resources %s' % (
+        format_number(width), format_number(height), resources)
+
+
+def resources_dictionary(xobjects: Dict[str, str], font: Optional[str] = None,
+                         overlay: Optional[OverlayContent] = None) -> str:
+    """
+    Build a resource dictionary.
+    
+    Args:
+        xobjects: Resource name -> object reference of the XObjects used
+        font: Reference of the overlay font, if text is drawn
+        overlay: Overlay content whose opacities are needed
+    """
+    entries = ['/XObject << %s >>' % ' '.join('/%s %s' % item for item in xobjects.items())]
+    if font is not None:
+        entries.append('/Font << /%s %s >>' % (FONT_NAME, font))
+    if overlay is not None and overlay.opacities:
+        entries.append('/ExtGState << %s >>' % opacity_entries(overlay))
+    return '<< %s >>' % ' '.join(entries)
+
+
+def add_overlay_operators(content: bytes, xobjects: Dict[str, str], form: Optional[str],
+                          overlay: Optional[OverlayContent]) -> bytes:
+    """
+    Append the shared overlay form and a page's own overlay text to its content.
+    
+    Args:
+        content: Content stream of the page
+        xobjects: XObject resources of the page; the form is added to them
+        form: Reference of the shared overlay form, if there is one
+        overlay: Overlays drawn on this page only, e.g. its page number
+    """
+    if form is not None:
+        xobjects[FORM_NAME] = form
+        content += b'\nq /%s Do Q' % FORM_NAME.encode('ascii')
+    if overlay is not None:
+        content += b'\n' + overlay.operators
+    return content
+
+
+class StreamBackend:
+    """Writes each page to the output as soon as it is added."""
+    
+    def __init__(self, output, page_width: float, page_height: float,
+                 overlays: Optional[List[Overlay]] = None, page_count: int = 0):
+        """
+        Args:
+            output: Output file path or writable binary file object
+            page_width: Page width in points
+            page_height: Page height in points
+            overlays: Overlays drawn on every page (see overlays)
+            page_count: Number of pages, shown by {pages} in overlay text
+                        until save() counts the pages that were added
+        """
+        self.page_width = page_width
+        self.page_height = page_height
+        self.overlays = overlays or []
+        self.page_count = page_count
+        if isinstance(output, str):
+            self._file = open(output, 'wb')
+            self._owns_file = True
+            self._path = output
+        else:
+            self._file = output
+            self._owns_file = False
+            self._path = None
+        self.writer = PDFStreamWriter(self._file)
+        # Image digest -> object number, so repeated images are written once
+        self._image_numbers: Dict[str, int] = {}
+        self._font: Optional[str] = None
+        # The overlay form is written with the first page
+        self._form: Optional[str] = None
+        self._form_written = False
+        # Reserved objects for each page's own overlay text, written on save
+        # when the number of pages is known
+        self._overlay_numbers: List[int] = []
+    
+    def _write_image(self, image: PageImage) -> int:
+        """Write an image XObject unless it was already written."""
+        number = self._image_numbers.get(image.digest)
+        if number is None:
+            smask = None
+            if image.smask is not None:
+                smask = '%d 0 R' % self._write_image(image.smask)
+            number = self.writer.write_stream(image_dictionary(image, smask), image.data)
+            self._image_numbers[image.digest] = number
+        return number
+    
+    def _font_reference(self) -> str:
+        """Write the overlay font unless it was already written."""
+        if self._font is None:
+            self._font = '%d 0 R' % self.writer.write_object(FONT_DICTIONARY)
+        return self._font
+    
+    def _overlay_form(self) -> Optional[str]:
+        """Write the form XObject shared by all pages, on first use."""
+        if not self._form_written:
+            self._form_written = True
+            content = static_content(self.overlays, self.page_width, self.page_height)
+            if content is not None:
+                xobjects = {name: '%d 0 R' % self._write_image(image)
+                            for name, image in content.images.items()}
+                font = self._font_reference() if content.uses_font else None
+                number = self.writer.write_stream(
+                    form_dictionary(self.page_width, self.page_height,
+                                    resources_dictionary(xobjects, font, content)),
+                    content.operators)
+                self._form = '%d 0 R' % number
+        return self._form
+    
+    def add_page(self, page: RenderedPage):
+        """Write a rendered page."""
+        image_number = self._write_image(page.image)
+        xobjects = {'Im0': '%d 0 R' % image_number}
+        content = page_operators(page, self.page_width, self.page_height, 'Im0')
+        
+        overlay = page_content(self.overlays, self.page_width, self.page_height,
+                               self.writer.page_count + 1, self.page_count)
+        content = add_overlay_operators(content, xobjects, self._overlay_form(), None)
+        font = self._font_reference() if overlay is not None else None
+        more_contents = []
+        if overlay is not None:
+            more_contents.append(self.writer.reserve())
+            self._overlay_numbers.append(more_contents[0])
+        self.writer.add_page(self.page_width, self.page_height, content,
+                             resources_dictionary(xobjects, font, overlay), more_contents)
+        if not self._owns_file:
+            # A pipe or socket reader gets each page as soon as it is written
+            self._file.flush()
+    
+    @property
+    def bytes_written(self) -> int:
+        """Size of the document written so far."""
+        return self.writer.position
+    
+    def save(self):
+        """Finish the document, with {pages} showing the number of pages added."""
+        for number, stream_number in enumerate(self._overlay_numbers, 1):
+            overlay = page_content(self.overlays, self.page_width, self.page_height,
+                                   number, self.writer.page_count)
+            self.writer.write_stream('', b'\n' + overlay.operators, stream_number)
+        self.writer.close()
+        self._close_file()
+    
+    def abort(self):
+        """Discard the document and remove the partially written file."""
+        self._close_file()
+        if self._path is not None and os.path.exists(self._path):
+            os.remove(self._path)
+    
+    def _close_file(self):
+        if self._owns_file:
+            self._file.close()
+        else:
+            self._file.flush()
+
+
+class FitzBackend:
+    """Builds the document with PyMuPDF."""
+    
+    def __init__(self, output, page_width: float, page_height: float,
+                 overlays: Optional[List[Overlay]] = None, page_count: int = 0):
+        """
+        Args:
+            output: Output file path or writable binary file object
+            page_width: Page width in points
+            page_height: Page height in points
+            overlays: Overlays drawn on every page (see overlays)
+            page_count: Number of pages, shown by {pages} in overlay text
+                        until save() counts the pages that were added
+        """
+        self.output = output
+        self.page_width = page_width
+        self.page_height = page_height
+        self.overlays = overlays or []
+        self.page_count = page_count
+        self.doc = fitz.open()
+        # Image digest -> xref, so repeated images are stored once
+        self._image_xrefs: Dict[str, int] = {}
+        self._font: Optional[str] = None
+        # The overlay form is created with the first page
+        self._form: Optional[str] = None
+        self._form_written = False
+        # Streams with each page's own overlay text, rewritten on save if
+        # fewer pages than page_count were added
+        self._overlay_xrefs: List[int] = []
+    
+    def _new_stream(self, dictionary: str, data: bytes) -> int:
+        """Create a stream object holding already encoded data."""
+        xref = self.doc.get_new_xref()
+        self.doc.update_object(xref, '<< %s >>' % dictionary)
+        self.doc.update_stream(xref, data, new=True, compress=False)
+        return xref
+    
+    def _write_image(self, image: PageImage) -> int:
+        """Create an image XObject unless it was already created."""
+        xref = self._image_xrefs.get(image.digest)
+        if xref is None:
+            smask = None
+            if image.smask is not None:
+                smask = '%d 0 R' % self._write_image(image.smask)
+            xref = self._new_stream(image_dictionary(image, smask), image.data)
+            # update_stream drops /Filter and /DecodeParms for uncompressed
+            # writes, so set them afterwards
+            if image.filters:
+                self.doc.xref_set_key(xref, 'Filter',
+                                      '[%s]' % ' '.join('/' + f for f in image.filters))
+            if image.decode_parms:
+                self.doc.xref_set_key(xref, 'DecodeParms',
+                                      '[%s]' % format_dictionary(image.decode_parms))
+            self._image_xrefs[image.digest] = xref
+        return xref
+    
+    def _font_reference(self) -> str:
+        """Create the overlay font unless it was already created."""
+        if self._font is None:
+            xref = self.doc.get_new_xref()
+            self.doc.update_object(xref, FONT_DICTIONARY)
+            self._font = '%d 0 R' % xref
+        return self._font
+    
+    def _overlay_form(self) -> Optional[str]:
+        """Create the form XObject shared by all pages, on first use."""
+        if not self._form_written:
+            self._form_written = True
+            content = static_content(self.overlays, self.page_width, self.page_height)
+            if content is not None:
+                xobjects = {name: '%d 0 R' % self._write_image(image)
+                            for name, image in content.images.items()}
+                font = self._font_reference() if content.uses_font else None
+                xref = self._new_stream(
+                    form_dictionary(self.page_width, self.page_height,
+                                    resources_dictionary(xobjects, font, content)),
+                    content.operators)
+                self._form = '%d 0 R' % xref
+        return self._form
+    
+    def add_page(self, page: RenderedPage):
+        """Add a rendered page."""
+        image_xref = self._write_image(page.image)
+        xobjects = {'Im0': '%d 0 R' % image_xref}
+        content = page_operators(page, self.page_width, self.page_height, 'Im0')
+        
+        overlay = page_content(self.overlays, self.page_width, self.page_height,
+                               self.doc.page_count + 1, self.page_count)
+        content = add_overlay_operators(content, xobjects, self._overlay_form(), None)
+        font = self._font_reference() if overlay is not None else None
+        contents = '%d 0 R' % self._new_stream('', content)
+        if overlay is not None:
+            overlay_xref = self._new_stream('', b'\n' + overlay.operators)
+            self._overlay_xrefs.append(overlay_xref)
+            contents = '[%s %d 0 R]' % (contents, overlay_xref)
+        
+        pdf_page = self.doc.new_page(width=self.page_width, height=self.page_height)
+        self.doc.xref_set_key(pdf_page.xref, 'Resources',
+                              resources_dictionary(xobjects, font, overlay))
+        self.doc.xref_set_key(pdf_page.xref, 'Contents', contents)
+    
+    def save(self):
+        """Write the document, with {pages} showing the number of pages added."""
+        if self._overlay_xrefs and self.doc.page_count != self.page_count:
+            for number, xref in enumerate(self._overlay_xrefs, 1):
+                overlay = page_content(self.overlays, self.page_width, self.page_height,
+                                       number, self.doc.page_count)
+                self.doc.update_stream(xref, b'\n' + overlay.operators, compress=False)
+        self.doc.save(self.output)
+        self.doc.close()
+    
+    def abort(self):
+        """Discard the document; nothing is written to the output before save()."""
+        self.doc.close()
+
+
+# Available backends by name
+BACKENDS = {
+    'stream': StreamBackend,
+    'fitz': FitzBackend,
+}
+
+try:
+    from reportlab_backend import ReportlabBackend
+except ImportError:
+    # Builds without reportlab export through PyMuPDF
+    DEFAULT_BACKEND = 'fitz'
+else:
+    BACKENDS['reportlab'] = ReportlabBackend
+    DEFAULT_BACKEND = 'reportlab'
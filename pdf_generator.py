@@ -1,23 +1,243 @@
 """
-PDF generation module using reportlab.
+PDF generation module.
 """
 
-from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
 from PIL import Image
-import io
-from typing import List
-from models import ImageItem, PageConfig
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import BinaryIO, Callable, Iterable, List, Optional, Sized
+from models import ExportReport, ImageItem, PageConfig, PageFailure, PageReport
 from page_formats import get_page_size
 from image_processor import ImageProcessor
+from page_renderer import page_key, render_page
+from pdf_backends import BACKENDS, DEFAULT_BACKEND
+from pdf_optimizer import optimize_pdf
+from render_cache import RenderCache
+from export_journal import ExportJournal
+from size_budget import (DOCUMENT_OVERHEAD, PAGE_OVERHEAD, QUALITY_LEVELS,
+                         level_config, page_budgets)
+
+
+# Most times the pages are fitted and written for a target size. Refitting
+# goes on while the saved file exceeds the target and a page can still go
+# lower, which every page can at most once per level
+TARGET_SIZE_ATTEMPTS = len(QUALITY_LEVELS)
+
+# Worker processes are started fresh rather than forked: exports run in a
+# thread, and a fork taken while another thread holds a lock (such as an
+# archive handle's) would leave the worker waiting on it forever
+_MP_CONTEXT = multiprocessing.get_context('spawn')
 
 
 class PDFGenerator:
     """Handles PDF generation from processed images."""
     
+    @staticmethod
+    def iter_rendered_pages(images: Iterable[ImageItem], page_config: PageConfig,
+                            workers: Optional[int] = 1,
+                            max_in_flight: Optional[int] = None,
+                            cache: Optional[RenderCache] = None,
+                            page_configs: Optional[List[PageConfig]] = None,
+                            on_error: Optional[Callable[[int, Exception], None]] = None):
+        """
+        Render pages and yield their encoded data in the original order.
+        
+        Args:
+            images: ImageItem objects; any iterable, consumed only as far
+                    as the pages in flight need
+            page_config: Page configuration
+            workers: Number of worker processes (1 renders in this process,
+                     None uses all CPU cores)
+            max_in_flight: Maximum number of pages submitted but not yet
+                           consumed (defaults to twice the worker count)
+            cache: Optional on-disk cache; pages found there are not rendered
+                   again and newly rendered pages are added to it, except
+                   source images embedded unchanged
+            page_configs: Optional configuration for each page, used
+                          instead of page_config
+            on_error: Optional function(index, error). When given, a page
+                      that fails to render is passed to it and yielded as
+                      None instead of stopping the iteration
+        
+        Yields:
+            RenderedPage objects (or None for failed pages), one per ImageItem
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        
+        parallel = workers > 1 and not (isinstance(images, Sized) and len(images) <= 1)
+        if not parallel:
+            max_in_flight = 1
+        elif max_in_flight is None:
+            max_in_flight = workers * 2
+        max_in_flight = max(max_in_flight, 1)
+        
+        pool = (ProcessPoolExecutor(max_workers=workers, mp_context=_MP_CONTEXT)
+                if parallel else None)
+        
+        # Repeated pages reuse the job of their first occurrence. Once that
+        # page has been yielded, only a copy without image data is kept,
+        # which the backends resolve to the XObject they already wrote.
+        source_digests = {}
+        jobs = {}
+        
+        def submit(item, config):
+            """Start rendering an item; returns (key, job, store_in_cache)."""
+            try:
+                key = None
+                if page_config.deduplicate or cache is not None:
+                    key = page_key(item, config, source_digests)
+                    if page_config.deduplicate and key in jobs:
+                        return key, jobs[key], False
+                
+                job = cache.get(key) if cache is not None else None
+                store = cache is not None and job is None
+                if job is None:
+                    if pool is not None:
+                        job = pool.submit(render_page, item, config)
+                    else:
+                        job = render_page(item, config)
+                if page_config.deduplicate:
+                    jobs[key] = job
+                return key, job, store
+            except Exception as e:
+                if on_error is None:
+                    raise
+                # Reported when the page's turn comes
+                return None, e, False
+        
+        try:
+            configs = itertools.repeat(page_config) if page_configs is None else page_configs
+            items = zip(images, configs)
+            pending = deque()
+            
+            # Keep a bounded window of jobs so finished pages that are
+            # waiting for an earlier one cannot pile up in memory
+            for item, config in items:
+                pending.append(submit(item, config))
+                if len(pending) >= max_in_flight:
+                    break
+            
+            index = 0
+            while pending:
+                key, job, store = pending.popleft()
+                try:
+                    if isinstance(job, Exception):
+                        raise job
+                    page = job.result() if isinstance(job, Future) else job
+                except Exception as e:
+                    if on_error is None:
+                        raise
+                    on_error(index, e)
+                    page = None
+                else:
+                    # Source data embedded unchanged is cheaper to read
+                    # again than to copy into the cache and journal
+                    if store and not page.image.passthrough:
+                        cache.put(key, page)
+                    if page_config.deduplicate and jobs[key] is job:
+                        jobs[key] = page.without_image_data()
+                index += 1
+                
+                next_item = next(items, None)
+                if next_item is not None:
+                    pending.append(submit(*next_item))
+                yield page
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+    
+    @staticmethod
+    def fit_to_size(images: List[ImageItem], page_config: PageConfig, target_size: int,
+                    workers: Optional[int] = 1, cache: Optional[RenderCache] = None,
+                    start_levels: Optional[List[int]] = None,
+                    cancel_check: Optional[Callable[[], bool]] = None,
+                    skip_errors: bool = False) -> Optional[List[int]]:
+        """
+        Choose a quality level for each page so the document fits a target size.
+        
+        The budget is split across pages by pixel area (see size_budget).
+        Every page over its share is trial-encoded at its next lower level,
+        all of them in parallel, until the pages fit or cannot go lower.
+        
+        Args:
+            images: List of ImageItem objects
+            page_config: Page configuration
+            target_size: Maximum file size in bytes
+            workers: Number of processes used for trial encodes
+            cache: Optional render cache; trial pages are added to it, so
+                   writing the chosen levels afterwards renders nothing again
+            start_levels: Levels to start from instead of level 0
+            cancel_check: Optional function returning True to stop early
+            skip_errors: Count pages that fail to render as empty instead
+                         of raising
+        
+        Returns:
+            Index into QUALITY_LEVELS for each page, or None if cancelled
+        """
+        levels = list(start_levels) if start_levels else [0] * len(images)
+        sizes = [0] * len(images)
+        weights = [0] * len(images)
+        budget = target_size - DOCUMENT_OVERHEAD - PAGE_OVERHEAD * len(images)
+        
+        # Identical pages share one image in the file, so only the first of
+        # them (its owner) is fitted and the others follow its level
+        owners = list(range(len(images)))
+        first_pages = {}
+        
+        trials = list(range(len(images)))
+        while trials:
+            pages = PDFGenerator.iter_rendered_pages(
+                [images[i] for i in trials], page_config, workers, cache=cache,
+                page_configs=[level_config(page_config, levels[i]) for i in trials],
+                on_error=(lambda index, error: None) if skip_errors else None
+            )
+            try:
+                for i, page in zip(trials, pages):
+                    if cancel_check and cancel_check():
+                        return None
+                    if page is None:
+                        continue
+                    if not weights[i]:
+                        owners[i] = first_pages.setdefault(page.image.digest, i)
+                        if owners[i] != i:
+                            continue
+                        weights[i] = page.image.width * page.image.height
+                    sizes[i] = page.image.encoded_size
+            finally:
+                pages.close()
+            
+            # Pages at the lowest level use what they need; the rest is shared
+            lowest = len(QUALITY_LEVELS) - 1
+            flexible = [i for i in range(len(images)) if levels[i] < lowest and owners[i] == i]
+            fixed_bytes = sum(sizes) - sum(sizes[i] for i in flexible)
+            shares = page_budgets([sizes[i] for i in flexible], [weights[i] for i in flexible],
+                                  budget - fixed_bytes)
+            trials = [i for i, share in zip(flexible, shares) if sizes[i] > share]
+            for i in trials:
+                levels[i] += 1
+        
+        for i, owner in enumerate(owners):
+            levels[i] = levels[owner]
+        return levels
+    
     @staticmethod
     def generate_pdf(output_path: str, images: List[ImageItem], 
-                    page_config: PageConfig) -> bool:
+                    page_config: PageConfig, workers: Optional[int] = 1,
+                    backend: Optional[str] = None,
+                    progress_callback: Optional[Callable[[int, int], None]] = None,
+                    cancel_check: Optional[Callable[[], bool]] = None,
+                    cache: Optional[RenderCache] = None,
+                    target_size: Optional[int] = None,
+                    report: Optional[ExportReport] = None,
+                    checkpoint_dir: Optional[str] = None,
+                    skip_errors: bool = False) -> bool:
         """
         Generate PDF from list of image items.
         
@@ -25,55 +245,469 @@ class PDFGenerator:
             output_path: Path to save PDF
             images: List of ImageItem objects
             page_config: Page configuration
+            workers: Number of processes used to render pages (1 renders
+                     serially, None uses all CPU cores)
+            backend: Output backend, 'reportlab', 'stream' or 'fitz'
+                     (None uses reportlab when it is installed). The stream
+                     backend writes each page to the file as soon as it is
+                     drawn, so peak memory does not grow with the page count
+            progress_callback: Optional callback function(current, total),
+                               called after each page is written
+            cancel_check: Optional function returning True when the export
+                          should stop; checked before each page
+            cache: Optional RenderCache, so re-exports only render pages
+                   whose source or settings changed
+            target_size: Maximum file size in bytes (None uses
+                         page_config.target_size_mb). Pages are exported at
+                         lower quality and DPI as needed; if even the lowest
+                         level is too large, the smallest file is kept
+            report: Optional ExportReport, filled in with the settings and
+                    size of each page and the size of the file
+            checkpoint_dir: Optional directory for a checkpoint journal
+                            (see export_journal). Rendered pages are kept
+                            there until the export succeeds, so running a
+                            failed or cancelled export again with the same
+                            directory resumes instead of starting over
+            skip_errors: Leave out pages whose image cannot be rendered,
+                         instead of failing the export. They are printed
+                         and listed in the report
         
         Returns:
-            True if successful, False otherwise
+            True if successful, False if failed or cancelled (or if every
+            page was skipped). No partial file is left behind in either case.
         """
         if not images:
             return False
         
+        journal = None
+        if checkpoint_dir is not None:
+            try:
+                journal = cache = ExportJournal(checkpoint_dir, cache)
+            except OSError as e:
+                print(f"Error opening checkpoint journal: {str(e)}")
+                return False
+        
+        if target_size is None:
+            target_size = int(page_config.target_size_mb * 1024 * 1024)
+        
+        # Trial pages are kept in a cache so the final write reuses them
+        temp_dir = None
+        if target_size and cache is None:
+            temp_dir = tempfile.mkdtemp(prefix='image2pdf-')
+            cache = RenderCache(temp_dir)
+        # Whether an attempt wrote a complete file that a later one replaces
+        written = False
+        succeeded = False
+        try:
+            levels = None
+            budget = target_size
+            for _ in range(TARGET_SIZE_ATTEMPTS if target_size else 1):
+                if target_size:
+                    levels = PDFGenerator.fit_to_size(images, page_config, budget, workers,
+                                                      cache, levels, cancel_check, skip_errors)
+                    if levels is None:
+                        return False
+                if not PDFGenerator._write_pdf(output_path, images, page_config, levels,
+                                               workers, backend, progress_callback,
+                                               cancel_check, cache, report,
+                                               skip_errors=skip_errors):
+                    return False
+                written = True
+                if not target_size:
+                    break
+                
+                # The overhead is an estimate; take the excess off the budget
+                excess = os.path.getsize(output_path) - target_size
+                if excess <= 0 or all(level == len(QUALITY_LEVELS) - 1 for level in levels):
+                    break
+                budget -= excess
+            
+            if report is not None:
+                report.target_size = target_size
+                if journal is not None:
+                    report.resumed_pages = journal.resumed_pages
+            if target_size and os.path.getsize(output_path) > target_size:
+                print(f"PDF is larger than the target size of {target_size} bytes: "
+                      f"{output_path}")
+            if journal is not None:
+                journal.remove()
+            succeeded = True
+            return True
+        except Exception as e:
+            print(f"Error generating PDF: {str(e)}")
+            return False
+        finally:
+            # A later target-size attempt that fails or is cancelled must
+            # not leave the file of an earlier one behind
+            if written and not succeeded and os.path.exists(output_path):
+                os.remove(output_path)
+            if temp_dir is not None:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+    
+    @staticmethod
+    def generate_pdf_stream(output: BinaryIO, images: Iterable[ImageItem],
+                            page_config: PageConfig, workers: Optional[int] = 1,
+                            progress_callback: Optional[Callable[[int, int], None]] = None,
+                            cancel_check: Optional[Callable[[], bool]] = None,
+                            cache: Optional[RenderCache] = None,
+                            report: Optional[ExportReport] = None,
+                            skip_errors: bool = False,
+                            page_count: Optional[int] = None) -> bool:
+        """
+        Write a PDF progressively to a binary file object.
+        
+        Items are taken from the iterable as rendering proceeds, and each
+        page is written to the output and flushed as soon as it is drawn
+        (with the stream backend), so the first pages go out before the
+        last items are known. Settings that need the finished file, the
+        target size and post-save optimization, are not applied.
+        
+        Args:
+            output: Writable binary file object, e.g. sys.stdout.buffer, a
+                    socket file or an HTTP response body; it does not need
+                    to be seekable, and is flushed but not closed
+            images: ImageItem objects; any iterable, including a generator
+            page_config: Page configuration
+            workers: Number of processes used to render pages
+            progress_callback: Optional callback function(current, total),
+                               called after each page is written; total is
+                               0 if the page count is not known
+            cancel_check: Optional function returning True when the export
+                          should stop; checked before each page
+            cache: Optional RenderCache
+            report: Optional ExportReport, filled in as by generate_pdf
+            skip_errors: Leave out pages whose image cannot be rendered
+            page_count: Number of pages, for progress_callback when images
+                        has no length. {pages} in overlay text is written
+                        at the end of the document, once the count is known
+        
+        Returns:
+            True if successful, False if failed or cancelled. The output
+            then ends with an incomplete document, which the reader must
+            discard.
+        """
+        if page_count is None and isinstance(images, Sized):
+            page_count = len(images)
+        return PDFGenerator._write_pdf(output, images, page_config, None, workers, 'stream',
+                                       progress_callback, cancel_check, cache, report,
+                                       skip_errors=skip_errors, page_count=page_count or 0)
+    
+    @staticmethod
+    def _write_pdf(output, images: Iterable[ImageItem], page_config: PageConfig,
+                   levels: Optional[List[int]], workers: Optional[int],
+                   backend: Optional[str],
+                   progress_callback: Optional[Callable[[int, int], None]],
+                   cancel_check: Optional[Callable[[], bool]],
+                   cache: Optional[RenderCache],
+                   report: Optional[ExportReport],
+                   skip_errors: bool = False,
+                   page_count: Optional[int] = None) -> bool:
+        """
+        Write all pages, each at its quality level (see generate_pdf).
+        
+        The output is a file path or a binary file object, and images any
+        iterable; page_count defaults to len(images).
+        """
+        page_configs = None
+        if levels is not None:
+            page_configs = [level_config(page_config, level) for level in levels]
+        page_reports = []
+        failures = []
+        
+        # Items taken from the iterable but not written yet
+        pending_items = {}
+        
+        def numbered(items):
+            for index, item in enumerate(items):
+                pending_items[index] = item
+                yield item
+        
+        def skip_page(index, error):
+            """Record a page that failed to render."""
+            item = pending_items[index]
+            source = item.file_path
+            if item.archive_member:
+                source = f"{source}/{item.archive_member}"
+            print(f"Error rendering page {index + 1} ({source}), skipped: {str(error)}")
+            failures.append(PageFailure(index, item.file_path, str(error),
+                                        archive_member=item.archive_member,
+                                        frame_index=item.frame_index))
+        
+        writer = None
+        rendered_pages = None
         try:
             # Get page size
             page_size = get_page_size(page_config.format_name)
+            total_pages = len(images) if page_count is None else page_count
             
-            # Create PDF canvas
-            c = canvas.Canvas(output_path, pagesize=(page_size.width, page_size.height))
+            # Create PDF writer
+            writer = BACKENDS[backend or DEFAULT_BACKEND](
+                output, page_size.width, page_size.height,
+                overlays=page_config.overlays, page_count=total_pages
+            )
             
-            # Process each image
-            for item in images:
-                # Process image with transformations
-                processed_img = ImageProcessor.process_image_item(
-                    item,
-                    page_size.width,
-                    page_size.height,
-                    page_config.margin,
-                    page_config.background_color
-                )
+            # Pages are rendered (possibly in parallel) and drawn in order
+            rendered_pages = PDFGenerator.iter_rendered_pages(
+                numbered(images), page_config, workers, cache=cache, page_configs=page_configs,
+                on_error=skip_page if skip_errors else None
+            )
+            for index, page in enumerate(rendered_pages):
+                if cancel_check and cancel_check():
+                    rendered_pages.close()
+                    writer.abort()
+                    return False
                 
-                # Convert PIL Image to bytes for reportlab
-                img_buffer = io.BytesIO()
-                processed_img.save(img_buffer, format='PNG')
-                img_buffer.seek(0)
+                item = pending_items.pop(index)
+                if page is not None:
+                    # Draw image on PDF
+                    writer.add_page(page)
+                    
+                    config = page_configs[index] if page_configs else page_config
+                    page_reports.append(PageReport(
+                        index=index,
+                        file_path=item.file_path,
+                        encoding=page.image.filters[0] if page.image.filters else 'none',
+                        image_bytes=page.image.encoded_size,
+                        target_dpi=config.target_dpi,
+                        jpeg_quality=config.jpeg_quality,
+                        level=levels[index] if levels else 0,
+                        archive_member=item.archive_member,
+                        frame_index=item.frame_index
+                    ))
                 
-                # Draw image on PDF
-                # Image already includes background and positioning
-                c.drawImage(ImageReader(img_buffer), 
-                          0, 0, 
-                          width=page_size.width, 
-                          height=page_size.height)
-                
-                # Add new page for next image (except for last one)
-                if item != images[-1]:
-                    c.showPage()
+                # Report progress
+                if progress_callback:
+                    progress_callback(index + 1, total_pages)
+            
+            if not page_reports:
+                raise ValueError("no page could be rendered")
             
             # Save PDF
-            c.save()
+            writer.save()
+            
+            # A failed optimization leaves the file as it was written;
+            # streamed output cannot be rewritten
+            if page_config.optimization != 'none' and isinstance(output, str):
+                try:
+                    optimize_pdf(output, page_config.optimization)
+                except Exception as e:
+                    print(f"Error optimizing PDF: {str(e)}")
+            
+            if report is not None:
+                report.pages = page_reports
+                report.failures = failures
+                if isinstance(output, str):
+                    report.file_size = os.path.getsize(output)
+                else:
+                    report.file_size = writer.bytes_written
             return True
             
         except Exception as e:
+            if rendered_pages is not None:
+                rendered_pages.close()
+            if writer is not None:
+                writer.abort()
             print(f"Error generating PDF: {str(e)}")
             return False
     
+    @staticmethod
+    def chunk_path(output_path: str, number: int, count: int) -> str:
+        """
+        Get the file name of a chunk, e.g. out_001.pdf for out.pdf.
+        
+        Args:
+            output_path: Path given for the whole export
+            number: Chunk number (1-based)
+            count: Number of chunks, which sets the number's width
+        """
+        stem, ext = os.path.splitext(output_path)
+        return f"{stem}_{number:0{max(3, len(str(count)))}d}{ext or '.pdf'}"
+    
+    @staticmethod
+    def plan_chunks(images: List[ImageItem], page_config: PageConfig,
+                    max_pages: Optional[int] = None, max_bytes: Optional[int] = None,
+                    workers: Optional[int] = 1,
+                    cache: Optional[RenderCache] = None) -> List[List[int]]:
+        """
+        Split pages into chunks of limited page count and estimated size.
+        
+        Limiting the size renders every page to measure it, so a cache
+        should be given to reuse those pages when the chunks are written.
+        
+        Args:
+            images: List of ImageItem objects
+            page_config: Page configuration
+            max_pages: Maximum number of pages per chunk, or None
+            max_bytes: Maximum size of a chunk in bytes, or None. A page
+                       that is larger on its own gets a chunk to itself
+            workers: Number of processes used to render pages for measuring
+            cache: Optional render cache the measured pages are added to
+        
+        Returns:
+            Page indices of each chunk, in order
+        """
+        if max_bytes is None:
+            step = max_pages or len(images)
+            return [list(range(start, min(start + step, len(images))))
+                    for start in range(0, len(images), step)]
+        
+        chunks = []
+        current = []
+        current_bytes = DOCUMENT_OVERHEAD
+        current_digests = set()
+        image_bytes = {}
+        
+        pages = PDFGenerator.iter_rendered_pages(images, page_config, workers, cache=cache)
+        try:
+            for index, page in enumerate(pages):
+                digest = page.image.digest
+                # Repeated pages come without data; an image is stored once per file
+                if page.image.data:
+                    image_bytes[digest] = page.image.encoded_size
+                page_bytes = PAGE_OVERHEAD
+                if digest not in current_digests:
+                    page_bytes += image_bytes[digest]
+                
+                full = ((max_pages and len(current) >= max_pages)
+                        or current_bytes + page_bytes > max_bytes)
+                if current and full:
+                    chunks.append(current)
+                    current = []
+                    current_bytes = DOCUMENT_OVERHEAD
+                    current_digests = set()
+                    page_bytes = PAGE_OVERHEAD + image_bytes[digest]
+                
+                current.append(index)
+                current_bytes += page_bytes
+                current_digests.add(digest)
+        finally:
+            pages.close()
+        
+        if current:
+            chunks.append(current)
+        return chunks
+    
+    @staticmethod
+    def generate_chunked_pdfs(output_path: str, images: List[ImageItem],
+                              page_config: PageConfig, max_pages: Optional[int] = None,
+                              max_bytes: Optional[int] = None,
+                              workers: Optional[int] = 1,
+                              backend: Optional[str] = None,
+                              progress_callback: Optional[Callable[[int, int], None]] = None,
+                              cancel_check: Optional[Callable[[], bool]] = None,
+                              cache: Optional[RenderCache] = None) -> bool:
+        """
+        Export pages to several PDF files of limited page count or size.
+        
+        The chunks are planned first (see plan_chunks) and then written in
+        parallel, each by its own process with its own PDF writer, to
+        files numbered after output_path (out.pdf gives out_001.pdf,
+        out_002.pdf, ...). A manifest, out_manifest.json, lists the files
+        and the source images on each of their pages.
+        
+        Args:
+            output_path: Path the chunk and manifest names are based on
+            images: List of ImageItem objects
+            page_config: Page configuration (a target size, if set, is not
+                         applied; use max_bytes instead)
+            max_pages: Maximum number of pages per file, or None
+            max_bytes: Maximum size of a file in bytes, or None
+            workers: Number of files written at the same time (None uses
+                     all CPU cores)
+            backend: Output backend (see generate_pdf)
+            progress_callback: Optional callback function(current, total),
+                               called with the number of pages written
+                               whenever a file is complete
+            cancel_check: Optional function returning True when the export
+                          should stop; checked between files
+            cache: Optional RenderCache shared by all chunks
+        
+        Returns:
+            True if successful, False if failed or cancelled. No files are
+            left behind in either case.
+        """
+        if not images:
+            return False
+        if workers is None:
+            workers = os.cpu_count() or 1
+        
+        # Pages measured for planning are reused when the chunks are written
+        temp_dir = None
+        if cache is None and max_bytes is not None:
+            temp_dir = tempfile.mkdtemp(prefix='image2pdf-')
+            cache = RenderCache(temp_dir)
+        
+        paths = []
+        succeeded = False
+        pool = None
+        try:
+            chunks = PDFGenerator.plan_chunks(images, page_config, max_pages, max_bytes,
+                                              workers, cache)
+            paths = [PDFGenerator.chunk_path(output_path, number, len(chunks))
+                     for number in range(1, len(chunks) + 1)]
+            jobs = [(path, [images[i] for i in chunk], page_config, backend, cache)
+                    for path, chunk in zip(paths, chunks)]
+            
+            pages_done = 0
+            if workers > 1 and len(jobs) > 1:
+                pool = ProcessPoolExecutor(max_workers=workers, mp_context=_MP_CONTEXT)
+                futures = {pool.submit(_write_chunk, *job): job for job in jobs}
+                pending = set(futures)
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        if not future.result() or (cancel_check and cancel_check()):
+                            return False
+                        pages_done += len(futures[future][1])
+                        if progress_callback:
+                            progress_callback(pages_done, len(images))
+            else:
+                for job in jobs:
+                    if cancel_check and cancel_check():
+                        return False
+                    if not _write_chunk(*job):
+                        return False
+                    pages_done += len(job[1])
+                    if progress_callback:
+                        progress_callback(pages_done, len(images))
+            
+            manifest = {
+                "source_count": len(images),
+                "chunks": [
+                    {
+                        "file": os.path.basename(path),
+                        "size": os.path.getsize(path),
+                        "pages": [
+                            {"page": page + 1, "index": index,
+                             "file_path": images[index].file_path,
+                             "archive_member": images[index].archive_member,
+                             "frame_index": images[index].frame_index}
+                            for page, index in enumerate(chunk)
+                        ],
+                    }
+                    for path, chunk in zip(paths, chunks)
+                ],
+            }
+            stem = os.path.splitext(output_path)[0]
+            with open(stem + '_manifest.json', 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=2, ensure_ascii=False)
+            succeeded = True
+            return True
+            
+        except Exception as e:
+            print(f"Error generating chunked PDF: {str(e)}")
+            return False
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+            # A failed or cancelled export removes the files it wrote
+            if not succeeded:
+                for path in paths:
+                    if os.path.exists(path):
+                        os.remove(path)
+            if temp_dir is not None:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+    
     @staticmethod
     def generate_preview_image(images: List[ImageItem], page_config: PageConfig,
                               page_index: int = 0) -> Image.Image:
@@ -91,8 +725,9 @@ class PDFGenerator:
         if not images or page_index >= len(images):
             # Return empty page
             page_size = get_page_size(page_config.format_name)
+            scale = page_config.preview_dpi / 72.0
             return Image.new('RGB', 
-                           (int(page_size.width), int(page_size.height)), 
+                           (int(page_size.width * scale), int(page_size.height * scale)), 
                            page_config.background_color)
         
         # Get the image item for this page
@@ -105,5 +740,18 @@ class PDFGenerator:
             page_size.width,
             page_size.height,
             page_config.margin,
-            page_config.background_color
+            page_config.background_color,
+            page_config.preview_dpi,
+            page_config.memory_limit_mb
         )
+
+
+def _write_chunk(output_path: str, images: List[ImageItem], page_config: PageConfig,
+                 backend: Optional[str], cache: Optional[RenderCache]) -> bool:
+    """
+    Write one file of a chunked export.
+    
+    Defined at module level so it can be pickled into worker processes.
+    """
+    return PDFGenerator.generate_pdf(output_path, images, page_config, workers=1,
+                                     backend=backend, cache=cache, target_size=0)
@@ -4,10 +4,11 @@ PDF Merge Dialog - UI for merging multiple PDF files.
 
 from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton,
                             QListWidget, QLabel, QFileDialog, QMessageBox,
-                            QProgressDialog, QGroupBox, QListWidgetItem)
+                            QProgressDialog, QGroupBox, QListWidgetItem, QComboBox)
 from PyQt5.QtCore import Qt, QThread, pyqtSignal
 from PyQt5.QtGui import QIcon, QPixmap
 from pdf_merger import PDFMerger
+from pdf_optimizer import OPTIMIZATION_LEVELS
 import os
 
 
@@ -17,10 +18,11 @@ class MergeWorker(QThread):
     progress = pyqtSignal(int, int)  # current, total
     finished = pyqtSignal(bool, str)  # success, message
     
-    def __init__(self, pdf_paths, output_path):
+    def __init__(self, pdf_paths, output_path, optimization='none'):
         super().__init__()
         self.pdf_paths = pdf_paths
         self.output_path = output_path
+        self.optimization = optimization
     
     def run(self):
         """Run the merge operation in background."""
@@ -28,7 +30,8 @@ class MergeWorker(QThread):
             PDFMerger.merge_pdfs(
                 self.pdf_paths,
                 self.output_path,
-                progress_callback=lambda curr, total: self.progress.emit(curr, total)
+                progress_callback=lambda curr, total: self.progress.emit(curr, total),
+                optimization=self.optimization
             )
             self.finished.emit(True, "PDF files merged successfully!")
         except Exception as e:
@@ -102,6 +105,21 @@ class PDFMergeDialog(QDialog):
         list_group.setLayout(list_layout)
         layout.addWidget(list_group)
         
+        # Output optimization
+        optimization_layout = QHBoxLayout()
+        optimization_layout.addWidget(QLabel("Optimization:"))
+        self.optimization_combo = QComboBox()
+        self.optimization_combo.addItems(OPTIMIZATION_LEVELS)
+        self.optimization_combo.setToolTip(
+            "fast: remove unused objects and compress streams\n"
+            "compact: also merge duplicates and use object streams\n"
+            "maximum: smallest file, slowest\n"
+            "web: linearized for fast web view"
+        )
+        optimization_layout.addWidget(self.optimization_combo)
+        optimization_layout.addStretch()
+        layout.addLayout(optimization_layout)
+        
         # Dialog buttons
         button_layout = QHBoxLayout()
         button_layout.addStretch()
@@ -278,7 +296,8 @@ class PDFMergeDialog(QDialog):
         progress.setAutoReset(True)
         
         # Create and start worker thread
-        self.worker = MergeWorker(self.pdf_list, output_path)
+        self.worker = MergeWorker(self.pdf_list, output_path,
+                                  self.optimization_combo.currentText())
         self.worker.progress.connect(lambda curr, total: progress.setValue(curr))
         self.worker.finished.connect(lambda success, msg: self.on_merge_finished(success, msg, output_path))
         
@@ -4,6 +4,7 @@ PDF merger module using PyMuPDF (fitz).
 
 import fitz  # PyMuPDF
 from typing import List, Optional, Callable
+from pdf_optimizer import save_document
 import os
 
 
@@ -12,7 +13,8 @@ class PDFMerger:
     
     @staticmethod
     def merge_pdfs(pdf_paths: List[str], output_path: str, 
-                   progress_callback: Optional[Callable[[int, int], None]] = None) -> bool:
+                   progress_callback: Optional[Callable[[int, int], None]] = None,
+                   optimization: str = 'none') -> bool:
         """
         Merge multiple PDF files into a single PDF.
         
@@ -20,6 +22,8 @@ class PDFMerger:
             pdf_paths: List of paths to PDF files to merge
             output_path: Path where the merged PDF will be saved
             progress_callback: Optional callback function(current, total) for progress updates
+            optimization: Optimization level used to save the result
+                          (see pdf_optimizer.OPTIMIZATION_LEVELS)
         
         Returns:
             True if successful, False otherwise
@@ -66,7 +70,7 @@ class PDFMerger:
                     raise Exception(f"Error processing '{os.path.basename(pdf_path)}': {str(e)}")
             
             # Save the merged PDF
-            merged_pdf.save(output_path)
+            save_document(merged_pdf, output_path, optimization)
             merged_pdf.close()
             
             return True
@@ -0,0 +1,98 @@
+"""
+Post-save PDF optimization using PyMuPDF (fitz).
+
+Optimization levels, from fastest to smallest:
+
+- none: keep the file as it was written
+- fast: remove unused objects and compress uncompressed streams
+- compact: also merge duplicate objects and pack objects into object streams
+- maximum: also compare stream contents to find duplicates and clean up
+  content streams; the slowest level
+- web: like compact, but linearized for fast web view instead of using
+  object streams (MuPDF 1.24 and later can no longer linearize, so files
+  are then saved without linearization)
+"""
+
+import fitz  # PyMuPDF
+import inspect
+import os
+import tempfile
+
+
+# fitz.Document.save options for each level
+OPTIMIZATION_LEVELS = {
+    'none': {},
+    'fast': {'garbage': 1, 'deflate': True, 'deflate_images': True, 'deflate_fonts': True},
+    'compact': {'garbage': 3, 'deflate': True, 'deflate_images': True, 'deflate_fonts': True,
+                'use_objstms': 1},
+    'maximum': {'garbage': 4, 'deflate': True, 'deflate_images': True, 'deflate_fonts': True,
+                'use_objstms': 1, 'clean': True, 'compression_effort': 100},
+    'web': {'garbage': 3, 'deflate': True, 'deflate_images': True, 'deflate_fonts': True,
+            'linear': True},
+}
+
+
+def save_options(level: str) -> dict:
+    """
+    Get the fitz.Document.save options for an optimization level.
+    
+    Options that the installed PyMuPDF version does not know are left out.
+    
+    Args:
+        level: Optimization level name
+    
+    Returns:
+        Keyword arguments for fitz.Document.save
+    """
+    if level not in OPTIMIZATION_LEVELS:
+        raise ValueError(f"Unknown optimization level: {level}")
+    supported = inspect.signature(fitz.Document.save).parameters
+    return {key: value for key, value in OPTIMIZATION_LEVELS[level].items()
+            if key in supported}
+
+
+def save_document(doc: fitz.Document, output_path: str, level: str = 'none'):
+    """
+    Save a document with the options of an optimization level.
+    
+    Args:
+        doc: Document to save
+        output_path: Path to save the document to
+        level: Optimization level name
+    """
+    options = save_options(level)
+    try:
+        doc.save(output_path, **options)
+    except Exception as e:
+        if not options.pop('linear', False):
+            raise
+        print(f"Linearization is not supported, saving without it: {str(e)}")
+        doc.save(output_path, **options)
+
+
+def optimize_pdf(path: str, level: str):
+    """
+    Rewrite a saved PDF file with the options of an optimization level.
+    
+    The optimized file replaces the original only once it is complete.
+    
+    Args:
+        path: Path of the PDF file
+        level: Optimization level name
+    """
+    if level == 'none':
+        return
+    
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                    suffix='.pdf')
+    os.close(fd)
+    try:
+        doc = fitz.open(path)
+        try:
+            save_document(doc, tmp_path, level)
+        finally:
+            doc.close()
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,175 @@
+"""
+Minimal progressive PDF writer.
+
+Objects are written to the output as soon as they are added, and only
+their byte offsets are kept in memory, so memory use does not grow with
+the size of the page images.
+"""
+
+from typing import BinaryIO, Dict, List, Optional, Sequence
+
+
+def format_number(value: float) -> str:
+    """Format a number for a PDF content stream or dictionary."""
+    if value == int(value):
+        return str(int(value))
+    return ('%.6f' % value).rstrip('0').rstrip('.')
+
+
+def format_array(values) -> str:
+    """Format a sequence of numbers as a PDF array."""
+    return '[' + ' '.join(format_number(v) for v in values) + ']'
+
+
+def format_dictionary(entries: dict) -> str:
+    """Format a dictionary of numbers and booleans as a PDF dictionary."""
+    items = []
+    for key, value in entries.items():
+        if isinstance(value, bool):
+            value = 'true' if value else 'false'
+        else:
+            value = format_number(value)
+        items.append('/%s %s' % (key, value))
+    return '<< %s >>' % ' '.join(items)
+
+
+class PDFStreamWriter:
+    """Writes a PDF document object by object to a binary file object."""
+    
+    def __init__(self, file: BinaryIO, version: str = '1.5'):
+        """
+        Start a new document.
+        
+        Args:
+            file: Writable binary file object (does not need to be seekable)
+            version: PDF version written in the header
+        """
+        self._file = file
+        self._position = 0
+        self._offsets: Dict[int, int] = {}
+        self._next_number = 1
+        self._page_numbers: List[int] = []
+        self._closed = False
+        
+        self._write(b'%PDF-' + version.encode('ascii') + b'\n%\xe2\xe3\xcf\xd3\n')
+        
+        # The page tree is written last, but pages need to refer to it
+        self._pages_number = self.reserve()
+    
+    @property
+    def page_count(self) -> int:
+        """Number of pages added so far."""
+        return len(self._page_numbers)
+    
+    @property
+    def position(self) -> int:
+        """Number of bytes written so far."""
+        return self._position
+    
+    def _write(self, data: bytes):
+        self._file.write(data)
+        self._position += len(data)
+    
+    def reserve(self) -> int:
+        """Reserve an object number for an object that is written later."""
+        number = self._next_number
+        self._next_number += 1
+        return number
+    
+    def write_object(self, body: str, number: Optional[int] = None) -> int:
+        """
+        Write an object.
+        
+        Args:
+            body: PDF syntax of the object, e.g. a dictionary
+            number: Previously reserved object number, or None for a new one
+        
+        Returns:
+            Object number
+        """
+        if number is None:
+            number = self.reserve()
+        self._offsets[number] = self._position
+        self._write(b'%d 0 obj\n%s\nendobj\n' % (number, body.encode('latin-1')))
+        return number
+    
+    def write_stream(self, dictionary: str, data: bytes,
+                     number: Optional[int] = None) -> int:
+        """
+        Write a stream object.
+        
+        Args:
+            dictionary: Stream dictionary entries without the enclosing << >>
+                        and without /Length
+            data: Stream data, already encoded with the filters named in
+                  the dictionary
+            number: Previously reserved object number, or None for a new one
+        
+        Returns:
+            Object number
+        """
+        if number is None:
+            number = self.reserve()
+        self._offsets[number] = self._position
+        header = '%d 0 obj\n<< %s /Length %d >>\nstream\n' % (number, dictionary, len(data))
+        self._write(header.encode('latin-1'))
+        self._write(data)
+        self._write(b'\nendstream\nendobj\n')
+        return number
+    
+    def add_page(self, width: float, height: float, content: bytes,
+                 resources: str, more_contents: Sequence[int] = ()) -> int:
+        """
+        Write a page and its content stream.
+        
+        Args:
+            width: Page width in points
+            height: Page height in points
+            content: Uncompressed content stream
+            resources: Resource dictionary, including << >>
+            more_contents: Object numbers of content streams drawn after
+                           content, e.g. reserved ones written later
+        
+        Returns:
+            Object number of the page
+        """
+        content_number = self.write_stream('', content)
+        contents = '%d 0 R' % content_number
+        if more_contents:
+            contents = '[%s %s]' % (contents, ' '.join('%d 0 R' % number
+                                                       for number in more_contents))
+        page_number = self.write_object(
+            '<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %s %s] '
+            '/Resources %s /Contents %s >>'
+            % (self._pages_number, format_number(width), format_number(height),
+               resources, contents)
+        )
+        self._page_numbers.append(page_number)
+        return page_number
+    
+    def close(self):
+        """Write the page tree, catalog, cross-reference table and trailer."""
+        if self._closed:
+            return
+        self._closed = True
+        
+        kids = ' '.join('%d 0 R' % number for number in self._page_numbers)
+        self.write_object('<< /Type /Pages /Kids [%s] /Count %d >>'
+                          % (kids, len(self._page_numbers)),
+                          self._pages_number)
+        catalog_number = self.write_object('<< /Type /Catalog /Pages %d 0 R >>'
+                                           % self._pages_number)
+        
+        xref_position = self._position
+        size = self._next_number
+        lines = [b'xref\n0 %d\n' % size, b'0000000000 65535 f \n']
+        for number in range(1, size):
+            # Reserved numbers that were never written become free entries
+            offset = self._offsets.get(number)
+            if offset is None:
+                lines.append(b'0000000000 65535 f \n')
+            else:
+                lines.append(b'%010d 00000 n \n' % offset)
+        self._write(b''.join(lines))
+        self._write(b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+                    % (size, catalog_number, xref_position))
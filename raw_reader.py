@@ -0,0 +1,163 @@
+"""
+Memory-mapped reading of raw frame dumps and NumPy .npy arrays.
+
+Line-scan and machine-vision cameras write frames as headerless pixel
+dumps or as .npy arrays. Both are memory-mapped and each frame is wrapped
+with Image.frombuffer, so the pixels are read from the page cache on
+demand instead of being decoded into a second copy. Pillow maps 'L' and
+'RGBA' frames directly; 'RGB' frames are unpacked into Pillow's 4-byte
+layout once, and 16-bit frames are reduced to 8-bit gray.
+
+A raw file holds one or more frames of the same size back to back. Its
+layout comes from a RawFormat, or from a JSON sidecar next to the file
+(frame.raw.json) with the same fields. A .npy file describes itself: a
+2-D array or a 3-D array with 3 or 4 channels is one frame, a stack of
+those is one frame per entry.
+"""
+
+import json
+import os
+from dataclasses import asdict
+from typing import Optional
+from PIL import Image
+import numpy as np
+from models import RawFormat
+
+
+# Extensions of headerless pixel dumps
+RAW_EXTENSIONS = ('.raw', '.bin')
+
+NPY_EXTENSION = '.npy'
+
+# Suffix of the JSON file that describes a raw file's layout
+SIDECAR_SUFFIX = '.json'
+
+# Bytes per pixel of the supported raw modes
+RAW_MODES = {
+    'L': 1,
+    'I;16': 2,
+    'RGB': 3,
+    'RGBA': 4,
+}
+
+# Image modes of 8-bit arrays, by number of channels
+_CHANNEL_MODES = {3: 'RGB', 4: 'RGBA'}
+
+
+def is_raw_file(file_path: str) -> bool:
+    """Check whether a file is a raw dump or .npy array, by its extension."""
+    extension = os.path.splitext(file_path)[1].lower()
+    return extension in RAW_EXTENSIONS or extension == NPY_EXTENSION
+
+
+def read_sidecar(file_path: str) -> Optional[RawFormat]:
+    """
+    Read the layout of a raw file from its JSON sidecar.
+    
+    Returns:
+        RawFormat, or None if the file has no sidecar
+    """
+    try:
+        with open(file_path + SIDECAR_SUFFIX, 'r', encoding='utf-8') as f:
+            return RawFormat(**json.load(f))
+    except FileNotFoundError:
+        return None
+
+
+def write_sidecar(file_path: str, raw_format: RawFormat):
+    """Write the layout of a raw file to its JSON sidecar."""
+    with open(file_path + SIDECAR_SUFFIX, 'w', encoding='utf-8') as f:
+        json.dump(asdict(raw_format), f, indent=2)
+
+
+def _resolve_format(file_path: str, raw_format: Optional[RawFormat]) -> RawFormat:
+    """Return the given layout or the sidecar's, checked for consistency."""
+    if raw_format is None:
+        raw_format = read_sidecar(file_path)
+    if raw_format is None:
+        raise ValueError(f"no frame layout given and no {SIDECAR_SUFFIX} sidecar found")
+    if raw_format.mode not in RAW_MODES:
+        raise ValueError(f"unsupported raw mode: {raw_format.mode}")
+    if raw_format.stride and raw_format.stride < raw_format.width * RAW_MODES[raw_format.mode]:
+        raise ValueError("the stride is shorter than a row of pixels")
+    return raw_format
+
+
+def _frame_bytes(raw_format: RawFormat) -> int:
+    """Bytes per frame of a raw file."""
+    stride = raw_format.stride or raw_format.width * RAW_MODES[raw_format.mode]
+    return stride * raw_format.height
+
+
+def _is_single_frame(array: np.ndarray) -> bool:
+    """Check whether a .npy array is one frame rather than a stack of frames."""
+    return array.ndim == 2 or (array.ndim == 3 and array.shape[2] in _CHANNEL_MODES)
+
+
+def _npy_frames(array: np.ndarray) -> int:
+    """Number of frames in a .npy array."""
+    if _is_single_frame(array):
+        return 1
+    if array.ndim in (3, 4):
+        return array.shape[0]
+    raise ValueError(f"unsupported array shape: {array.shape}")
+
+
+def frame_count(file_path: str, raw_format: Optional[RawFormat] = None) -> int:
+    """Return the number of frames in a raw file or .npy array."""
+    if file_path.lower().endswith(NPY_EXTENSION):
+        return _npy_frames(np.load(file_path, mmap_mode='r'))
+    raw_format = _resolve_format(file_path, raw_format)
+    size = os.path.getsize(file_path) - raw_format.offset
+    return max(1, size // _frame_bytes(raw_format))
+
+
+def _array_image(frame: np.ndarray) -> Image.Image:
+    """Wrap one frame of a .npy array in an image, without copying 8-bit data."""
+    if frame.dtype == np.bool_:
+        return Image.fromarray(frame.view(np.uint8) * np.uint8(255))
+    if frame.dtype == np.uint16:
+        frame = (frame >> 8).astype(np.uint8)
+    elif frame.dtype != np.uint8:
+        raise ValueError(f"unsupported array type: {frame.dtype}")
+    
+    mode = 'L' if frame.ndim == 2 else _CHANNEL_MODES[frame.shape[2]]
+    if not frame.flags['C_CONTIGUOUS']:
+        # Fortran-ordered arrays have no row-major buffer to map
+        frame = np.ascontiguousarray(frame)
+    height, width = frame.shape[:2]
+    return Image.frombuffer(mode, (width, height), frame, 'raw', mode, 0, 1)
+
+
+def open_frame(file_path: str, frame_index: int = 0,
+               raw_format: Optional[RawFormat] = None) -> Image.Image:
+    """
+    Open one frame of a raw file or .npy array through a memory map.
+    
+    Args:
+        file_path: Path to the file
+        frame_index: Frame to open
+        raw_format: Layout of a raw file; read from its sidecar if None
+    
+    Returns:
+        Image backed by the mapped file where Pillow allows it
+    """
+    if file_path.lower().endswith(NPY_EXTENSION):
+        array = np.load(file_path, mmap_mode='r')
+        if not 0 <= frame_index < _npy_frames(array):
+            raise ValueError(f"frame {frame_index} does not exist")
+        return _array_image(array if _is_single_frame(array) else array[frame_index])
+    
+    raw_format = _resolve_format(file_path, raw_format)
+    frame_bytes = _frame_bytes(raw_format)
+    start = raw_format.offset + frame_index * frame_bytes
+    if start + frame_bytes > os.path.getsize(file_path):
+        raise ValueError(f"frame {frame_index} is past the end of the file")
+    data = np.memmap(file_path, dtype=np.uint8, mode='r', offset=start, shape=(frame_bytes,))
+    
+    size = (raw_format.width, raw_format.height)
+    stride = raw_format.stride or raw_format.width * RAW_MODES[raw_format.mode]
+    if raw_format.mode == 'I;16':
+        rows = data.view('<u2').reshape(raw_format.height, stride // 2)
+        return Image.fromarray((rows[:, :raw_format.width] >> 8).astype(np.uint8))
+    return Image.frombuffer(raw_format.mode, size, data, 'raw', raw_format.mode, stride, 1)
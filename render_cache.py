@@ -0,0 +1,190 @@
+"""
+Persistent on-disk cache of rendered pages.
+
+Pages are stored under their page_key, which covers the source file's
+contents and every transform, DPI and encoder setting, so re-exporting a
+project only renders the pages that changed. The cache is size-limited
+and evicts the least recently used pages first.
+
+Usage:
+    python render_cache.py info [--dir DIR] [--journals-dir DIR]
+    python render_cache.py clear [--dir DIR] [--journals-dir DIR]
+
+Both commands also cover the checkpoint journals of unfinished exports
+(see export_journal).
+"""
+
+import argparse
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+from typing import Optional
+from page_renderer import RenderedPage
+
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024  # 1 GB
+
+# Fraction of the size limit the cache is trimmed to when it overflows
+_EVICT_TARGET = 0.9
+
+_ENTRY_SUFFIX = '.page'
+
+
+def default_cache_dir() -> str:
+    """Return the platform's per-user cache directory for rendered pages."""
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+        return os.path.join(base, 'Image2PDF', 'cache', 'pages')
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'image2pdf', 'pages')
+
+
+class RenderCache:
+    """Content-addressed page cache with a size limit and LRU eviction."""
+    
+    def __init__(self, directory: Optional[str] = None,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        Args:
+            directory: Cache directory (defaults to default_cache_dir())
+            max_bytes: Maximum total size of cached pages
+        """
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        self._total_bytes = sum(os.path.getsize(path) for path in self._entry_paths())
+    
+    def _entry_paths(self):
+        """Yield the paths of all cached entries."""
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(_ENTRY_SUFFIX):
+                    yield os.path.join(root, name)
+    
+    def keys(self) -> set:
+        """Return the keys of all cached pages."""
+        return {os.path.basename(path)[:-len(_ENTRY_SUFFIX)] for path in self._entry_paths()}
+    
+    def _path(self, key: str) -> str:
+        # Two-level layout keeps directories small
+        return os.path.join(self.directory, key[:2], key + _ENTRY_SUFFIX)
+    
+    def get(self, key: str) -> Optional[RenderedPage]:
+        """
+        Look up a rendered page.
+        
+        Returns:
+            RenderedPage, or None if the page is not cached or unreadable
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                page = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError):
+            return None
+        
+        # Mark as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return page
+    
+    def put(self, key: str, page: RenderedPage):
+        """Store a rendered page, evicting old pages if the cache is full."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        
+        old_size = os.path.getsize(path) if os.path.exists(path) else 0
+        
+        # Write to a temporary file first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(page, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        
+        self._total_bytes += os.path.getsize(path) - old_size
+        if self._total_bytes > self.max_bytes:
+            self.evict()
+    
+    def evict(self):
+        """Remove least recently used pages until the cache is below its limit."""
+        entries = []
+        for path in self._entry_paths():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * _EVICT_TARGET
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._total_bytes = total
+    
+    def info(self) -> dict:
+        """Return the cache location, entry count and size."""
+        paths = list(self._entry_paths())
+        return {
+            "directory": self.directory,
+            "entries": len(paths),
+            "size": sum(os.path.getsize(path) for path in paths),
+            "max_size": self.max_bytes,
+        }
+    
+    def clear(self):
+        """Remove all cached pages."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory, exist_ok=True)
+        self._total_bytes = 0
+
+
+def main():
+    # Imported here: export_journal builds on this module
+    from export_journal import clear_journals, journals_dir, journals_info
+    
+    parser = argparse.ArgumentParser(
+        description="Inspect or clear the page render cache and export journals.")
+    parser.add_argument('command', choices=['info', 'clear'])
+    parser.add_argument('--dir', help='Cache directory (default: %(default)s)',
+                        default=default_cache_dir())
+    parser.add_argument('--journals-dir', help='Journals directory (default: %(default)s)',
+                        default=journals_dir())
+    args = parser.parse_args()
+    
+    cache = RenderCache(args.dir)
+    if args.command == 'clear':
+        cache.clear()
+        clear_journals(args.journals_dir)
+        print(f"Cleared {cache.directory}")
+        print(f"Cleared {args.journals_dir}")
+        return
+    
+    info = cache.info()
+    print(f"Directory: {info['directory']}")
+    print(f"Entries:   {info['entries']}")
+    print(f"Size:      {info['size'] / (1024 * 1024):.1f} MB "
+          f"of {info['max_size'] / (1024 * 1024):.0f} MB")
+    
+    journals = journals_info(args.journals_dir)
+    print(f"Journals:  {journals['journals']} unfinished export(s), "
+          f"{journals['size'] / (1024 * 1024):.1f} MB in {journals['directory']}")
+
+
+if __name__ == '__main__':
+    main()
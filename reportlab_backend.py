@@ -0,0 +1,216 @@
+"""
+reportlab output backend.
+
+Kept in its own module so builds without reportlab can still import the
+other backends.
+"""
+
+from typing import List, Optional
+from reportlab.pdfgen import canvas
+from reportlab.pdfbase import pdfdoc
+from models import Overlay
+from overlays import (BASELINE_OFFSET, FORM_NAME, anchor_matrix, is_per_page,
+                      load_overlay_image, overlay_text)
+from page_renderer import PageImage, RenderedPage
+
+
+class _EncodedImageXObject(pdfdoc.PDFImageXObject):
+    """Image XObject whose stream data is already encoded."""
+    
+    def __init__(self, name: str, image: PageImage, smask: Optional[str] = None):
+        self.name = name
+        self._smask = smask
+        self.width = image.width
+        self.height = image.height
+        self.bitsPerComponent = image.bits_per_component
+        self.colorSpace = image.color_space
+        self._filters = image.filters
+        self._decode_parms = image.decode_parms
+        self._palette = image.palette
+        self.streamContent = image.data
+        self.mask = None
+    
+    def format(self, document):
+        S = pdfdoc.PDFStream(content=self.streamContent)
+        # The data is already encoded, so the document must not compress it again
+        S.filters = []
+        dictionary = S.dictionary
+        dictionary["Type"] = pdfdoc.PDFName("XObject")
+        dictionary["Subtype"] = pdfdoc.PDFName("Image")
+        dictionary["Width"] = self.width
+        dictionary["Height"] = self.height
+        dictionary["BitsPerComponent"] = self.bitsPerComponent
+        if self._palette:
+            # Bytes are written as they are, here as a hexadecimal string
+            dictionary["ColorSpace"] = pdfdoc.PDFArray([
+                pdfdoc.PDFName("Indexed"), pdfdoc.PDFName(self.colorSpace),
+                len(self._palette) // 3 - 1, b'<' + self._palette.hex().encode('ascii') + b'>'
+            ])
+        else:
+            dictionary["ColorSpace"] = pdfdoc.PDFName(self.colorSpace)
+        if self._filters:
+            dictionary["Filter"] = pdfdoc.PDFArray([pdfdoc.PDFName(f) for f in self._filters])
+        if self._decode_parms:
+            parms = {key: (pdfdoc.PDFtrue if value else pdfdoc.PDFfalse)
+                     if isinstance(value, bool) else value
+                     for key, value in self._decode_parms.items()}
+            dictionary["DecodeParms"] = pdfdoc.PDFArray([pdfdoc.PDFDictionary(parms)])
+        if self._smask:
+            dictionary["SMask"] = pdfdoc.PDFObjectReference(self._smask)
+        dictionary["Length"] = len(self.streamContent)
+        return S.format(document)
+
+
+class ReportlabBackend:
+    """Builds the document with a reportlab canvas."""
+    
+    def __init__(self, output, page_width: float, page_height: float,
+                 overlays: Optional[List[Overlay]] = None, page_count: int = 0):
+        """
+        Args:
+            output: Output file path or writable binary file object
+            page_width: Page width in points
+            page_height: Page height in points
+            overlays: Overlays drawn on every page (see overlays)
+            page_count: Number of pages; save() shows the number of pages
+                        that were added for {pages} in overlay text
+        """
+        self.page_width = page_width
+        self.page_height = page_height
+        self.overlays = overlays or []
+        self.page_count = page_count
+        self.canvas = canvas.Canvas(output, pagesize=(page_width, page_height))
+        # The overlay form is drawn with the first page
+        self._form_drawn = False
+        # Each page draws its own overlay text from a form of its own,
+        # which is filled in on save, when {pages} is known
+        self._per_page = [overlay for overlay in self.overlays if is_per_page(overlay)]
+        self._pages_added = 0
+    
+    def _draw_image_xobject(self, image: PageImage, matrix: tuple):
+        """
+        Draw an encoded image with the given transformation matrix.
+        
+        Mirrors the XObject bookkeeping in reportlab's Canvas.drawImage, which
+        can only embed JPEG files and raw pixel data.
+        """
+        c = self.canvas
+        name = image.digest
+        reg_name = self._register_image(image)
+        
+        c._currentPageHasImages = 1
+        c.saveState()
+        c.transform(*matrix)
+        c._code.append('/%s Do' % reg_name)
+        c.restoreState()
+        c._formsinuse.append(name)
+    
+    def _register_image(self, image: PageImage) -> str:
+        """Add an encoded image and its soft mask to the document once; returns its name."""
+        c = self.canvas
+        reg_name = c._doc.getXObjectName(image.digest)
+        if reg_name not in c._doc.idToObject:
+            smask = None
+            if image.smask is not None:
+                smask = self._register_image(image.smask)
+            img_obj = _EncodedImageXObject(image.digest, image, smask)
+            c._setXObjects(img_obj)
+            c._doc.Reference(img_obj, reg_name)
+            c._doc.addForm(image.digest, img_obj)
+            if 'JPXDecode' in image.filters:
+                c._doc._pdfVersion = max(c._doc._pdfVersion, (1, 5))
+        return reg_name
+    
+    def _draw_overlay(self, overlay: Overlay, text: str = '', image: Optional[PageImage] = None):
+        """Draw one overlay, like overlays.static_content and page_content do."""
+        c = self.canvas
+        c.saveState()
+        c.transform(*anchor_matrix(overlay, self.page_width, self.page_height))
+        if overlay.opacity < 1:
+            c.setFillAlpha(max(0.0, overlay.opacity))
+            c.setStrokeAlpha(max(0.0, overlay.opacity))
+        if image is not None:
+            width = overlay.width * self.page_width
+            height = width * image.height / image.width
+            self._draw_image_xobject(image, (width, 0, 0, height, -width / 2, -height / 2))
+        else:
+            r, g, b = overlay.color
+            c.setFillColorRGB(r / 255, g / 255, b / 255)
+            c.setFont('Helvetica', overlay.font_size)
+            c.drawCentredString(0, -BASELINE_OFFSET * overlay.font_size, text)
+        c.restoreState()
+    
+    def _overlay_form(self) -> bool:
+        """Draw the form shared by all pages on first use; returns whether there is one."""
+        shared = [overlay for overlay in self.overlays if not is_per_page(overlay)]
+        if shared and not self._form_drawn:
+            self._form_drawn = True
+            c = self.canvas
+            c.beginForm(FORM_NAME, 0, 0, self.page_width, self.page_height)
+            for overlay in shared:
+                if overlay.image_path:
+                    self._draw_overlay(overlay, image=load_overlay_image(overlay.image_path))
+                else:
+                    self._draw_overlay(overlay, overlay_text(overlay))
+            self._end_form(FORM_NAME)
+        return bool(shared)
+    
+    def _end_form(self, name: str):
+        """Finish the form being drawn."""
+        c = self.canvas
+        c.endForm()
+        # reportlab leaves the opacity states out of a form's resources
+        form = c._doc.idToObject[pdfdoc.xObjectName(name)]
+        if form.ExtGState:
+            resources = pdfdoc.PDFResourceDictionary()
+            resources.basicFonts()
+            resources.allProcs()
+            resources.XObject = form.XObjects
+            resources.ExtGState = form.ExtGState
+            form.Resources = resources
+    
+    @staticmethod
+    def _page_form_name(page_number: int) -> str:
+        """Name of the form with a page's own overlay text."""
+        return '%s%d' % (FORM_NAME, page_number)
+    
+    def add_page(self, page: RenderedPage):
+        """Draw a rendered page and finish it."""
+        c = self.canvas
+        if page.background is not None:
+            r, g, b = page.background
+            c.setFillColorRGB(r / 255, g / 255, b / 255)
+            c.rect(0, 0, self.page_width, self.page_height, stroke=0, fill=1)
+        
+        c.saveState()
+        if page.clip is not None:
+            path = c.beginPath()
+            path.rect(*page.clip)
+            c.clipPath(path, stroke=0, fill=0)
+        
+        self._draw_image_xobject(page.image, page.matrix)
+        c.restoreState()
+        
+        if self._overlay_form():
+            c.doForm(FORM_NAME)
+        self._pages_added += 1
+        if self._per_page:
+            c.doForm(self._page_form_name(self._pages_added))
+        
+        # Finish the page; the canvas drops a trailing empty page on save
+        c.showPage()
+    
+    def save(self):
+        """Write the document, with {pages} showing the number of pages added."""
+        c = self.canvas
+        if self._per_page:
+            for number in range(1, self._pages_added + 1):
+                c.beginForm(self._page_form_name(number), 0, 0,
+                            self.page_width, self.page_height)
+                for overlay in self._per_page:
+                    self._draw_overlay(overlay, overlay_text(overlay, number, self._pages_added))
+                self._end_form(self._page_form_name(number))
+        c.save()
+    
+    def abort(self):
+        """Discard the document; nothing is written to the output before save()."""
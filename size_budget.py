@@ -0,0 +1,88 @@
+"""
+Quality levels and byte budgets for exports with a target file size.
+
+Each page starts at the configured settings (level 0) and steps down a
+ladder of lower JPEG quality and export DPI until its share of the
+budget is met. Shares are proportional to the pages' pixel areas; pages
+that already fit keep their size and leave the rest to the others.
+"""
+
+from dataclasses import replace
+from typing import List, Sequence
+from models import PageConfig
+
+
+# (DPI factor, JPEG quality) of each level; level 0 keeps the configuration
+QUALITY_LEVELS = [
+    (1.0, None),
+    (1.0, 75),
+    (1.0, 60),
+    (0.85, 50),
+    (0.7, 45),
+    (0.6, 40),
+    (0.5, 35),
+    (0.4, 30),
+    (0.3, 25),
+]
+
+# Estimated size of everything in the file except page images, in bytes
+DOCUMENT_OVERHEAD = 2048
+PAGE_OVERHEAD = 512
+
+
+def level_config(page_config: PageConfig, level: int) -> PageConfig:
+    """
+    Get the page configuration of a quality level.
+    
+    Levels above 0 re-encode every page: source images are no longer
+    embedded as they are, and the 'flate' and 'raw' encoders give way to
+    'auto' so photos can use JPEG.
+    
+    Args:
+        page_config: Configured page settings
+        level: Index into QUALITY_LEVELS
+    
+    Returns:
+        PageConfig for the level
+    """
+    if level == 0:
+        return page_config
+    dpi_factor, quality = QUALITY_LEVELS[level]
+    encoder = page_config.encoder if page_config.encoder == 'jpeg' else 'auto'
+    return replace(page_config,
+                   encoder=encoder,
+                   embed_source_images=False,
+                   jpeg_quality=min(quality, page_config.jpeg_quality),
+                   target_dpi=page_config.target_dpi * dpi_factor)
+
+
+def page_budgets(sizes: Sequence[int], weights: Sequence[int], budget: float) -> List[float]:
+    """
+    Split a byte budget across pages in proportion to their weights.
+    
+    Pages smaller than their share keep their size, and what they leave
+    over is shared among the others, so the budget is used up fully.
+    
+    Args:
+        sizes: Current encoded size of each page
+        weights: Weight of each page, e.g. its pixel area
+        budget: Bytes available for all pages
+    
+    Returns:
+        Bytes allowed for each page
+    """
+    shares = [float(size) for size in sizes]
+    remaining = float(budget)
+    open_pages = set(range(len(sizes)))
+    while open_pages:
+        total_weight = sum(weights[i] for i in open_pages)
+        fitting = [i for i in open_pages
+                   if not total_weight or sizes[i] <= remaining * weights[i] / total_weight]
+        if not fitting:
+            for i in open_pages:
+                shares[i] = remaining * weights[i] / total_weight
+            break
+        for i in fitting:
+            open_pages.remove(i)
+            remaining -= sizes[i]
+    return shares
@@ -0,0 +1,38 @@
+"""
+Tests for export checkpoint journals.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from export_journal import ExportJournal, journals_info, prune_journals
+
+
+def _journal(directory, name, size, age):
+    path = os.path.join(directory, name)
+    ExportJournal(path)
+    with open(os.path.join(path, 'page.page'), 'wb') as f:
+        f.write(b'x' * size)
+    used = time.time() - age
+    for target in (os.path.join(path, 'page.page'), path):
+        os.utime(target, (used, used))
+    return path
+
+
+def test_prune_removes_old_and_oversized_journals(tmp_path):
+    """Old journals go, then the least recently used beyond the size limit."""
+    directory = str(tmp_path)
+    old = _journal(directory, 'old', 100, 30 * 24 * 3600)
+    older = _journal(directory, 'older', 1000, 3600)
+    newer = _journal(directory, 'newer', 1000, 60)
+    kept = _journal(directory, 'kept', 1000, 40 * 24 * 3600)
+    
+    prune_journals(directory, keep=kept, max_bytes=2500)
+    
+    assert not os.path.exists(old)
+    assert not os.path.exists(older)
+    assert os.path.exists(newer) and os.path.exists(kept)
+    assert journals_info(directory)['journals'] == 2
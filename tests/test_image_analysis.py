@@ -0,0 +1,38 @@
+"""
+Tests for content analysis and encoding choice.
+"""
+
+import os
+import sys
+
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_analysis import choose_encoding
+
+
+def test_text_page_is_bilevel():
+    """Black text on white is reduced to 1-bit."""
+    img = Image.new('L', (400, 300), 255)
+    draw = ImageDraw.Draw(img)
+    for y in range(20, 280, 20):
+        draw.text((20, y), 'The quick brown fox jumps over the lazy dog', fill=0)
+    
+    reduced, encoder = choose_encoding(img)
+    
+    assert reduced.mode == '1'
+    assert encoder == 'flate'
+
+
+def test_smooth_gray_object_stays_gray():
+    """A white product shot with a smooth gray object is not thresholded."""
+    img = Image.new('L', (400, 300), 255)
+    draw = ImageDraw.Draw(img)
+    for radius in range(40, 0, -1):
+        draw.ellipse((200 - radius, 150 - radius, 200 + radius, 150 + radius),
+                     fill=80 + radius * 2)
+    
+    reduced, _ = choose_encoding(img)
+    
+    assert reduced.mode == 'L'
@@ -0,0 +1,85 @@
+"""
+Tests for ImageProcessor.
+"""
+
+import os
+import sys
+
+import pytest
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import CropRect, ImageItem
+from image_processor import ImageProcessor
+
+
+def test_trim_crop_native_mode_png(tmp_path):
+    """A small image that needs no conversion or reduction is trimmed to its content."""
+    path = str(tmp_path / 'page.png')
+    img = Image.new('RGB', (300, 200), (255, 255, 255))
+    ImageDraw.Draw(img).rectangle([60, 40, 239, 159], fill=(0, 0, 0))
+    img.save(path)
+    
+    crop = ImageProcessor.trim_crop(ImageItem(file_path=path, auto_trim=True))
+    
+    box = ImageProcessor.crop_box((300, 200), crop)
+    assert abs(box[0] - 60) <= 1 and abs(box[1] - 40) <= 1
+    assert abs(box[2] - 240) <= 1 and abs(box[3] - 160) <= 1
+
+
+def test_trim_crop_rgba_png(tmp_path):
+    """Images kept in their native RGBA mode are probed without errors."""
+    path = str(tmp_path / 'logo.png')
+    img = Image.new('RGBA', (120, 80), (255, 255, 255, 255))
+    ImageDraw.Draw(img).ellipse([30, 20, 89, 59], fill=(200, 0, 0, 255))
+    img.save(path)
+    
+    crop = ImageProcessor.trim_crop(ImageItem(file_path=path, auto_trim=True))
+    
+    assert crop.width < 1.0 and crop.height < 1.0
+
+
+def test_frame_count_mpo_is_one_page(tmp_path):
+    """A JPEG with an embedded secondary image (MPO) is a single page."""
+    path = str(tmp_path / 'photo.jpg')
+    Image.new('RGB', (64, 48), (255, 0, 0)).save(
+        path, format='MPO', save_all=True, append_images=[Image.new('RGB', (32, 24))])
+    
+    assert ImageProcessor.frame_count(path) == 1
+
+
+def test_frame_count_multi_page_tiff(tmp_path):
+    """Every page of a multi-page TIFF is a page of its own."""
+    path = str(tmp_path / 'scan.tif')
+    Image.new('L', (40, 30)).save(path, save_all=True, append_images=[Image.new('L', (40, 30))])
+    
+    assert ImageProcessor.frame_count(path) == 2
+
+
+def test_cropped_rgba_tiff_keeps_alpha(tmp_path):
+    """A crop of a strip-readable TIFF keeps its alpha channel."""
+    path = str(tmp_path / 'logo.tif')
+    img = Image.new('RGBA', (600, 400), (200, 0, 0, 0))
+    ImageDraw.Draw(img).ellipse([100, 100, 499, 299], fill=(200, 0, 0, 255))
+    img.save(path)
+    
+    item = ImageItem(file_path=path, crop=CropRect(0.05, 0.05, 0.9, 0.9))
+    region, _ = ImageProcessor.render_image_region(item, 595, 842, 36, 72)
+    
+    assert region.mode == 'RGBA'
+    assert region.getextrema()[3] == (0, 255)
+
+
+def test_pixel_limit_only_lifted_for_open_image(tmp_path, monkeypatch):
+    """Pillow's decompression-bomb check stays on outside open_image."""
+    path = str(tmp_path / 'large.png')
+    Image.new('L', (100, 100)).save(path)
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 1000)
+    
+    with ImageProcessor.open_image(path) as img:
+        assert img.size == (100, 100)
+    
+    assert Image.MAX_IMAGE_PIXELS == 1000
+    with pytest.raises(Image.DecompressionBombError):
+        Image.open(path)
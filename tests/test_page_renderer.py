@@ -0,0 +1,62 @@
+"""
+Tests for page rendering and source passthrough.
+"""
+
+import os
+import sys
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import ExportReport, ImageItem, PageConfig
+from pdf_generator import PDFGenerator
+from page_renderer import render_page
+from render_cache import RenderCache
+
+
+def test_mpo_embeds_first_picture(tmp_path):
+    """Phone photos saved as MPO embed their first JPEG picture unchanged."""
+    path = str(tmp_path / 'photo.jpg')
+    Image.new('RGB', (64, 48), (200, 30, 30)).save(
+        path, format='MPO', save_all=True, append_images=[Image.new('RGB', (32, 24))])
+    
+    page = render_page(ImageItem(file_path=path), PageConfig())
+    
+    assert page.image.filters == ('DCTDecode',)
+    assert (page.image.width, page.image.height) == (64, 48)
+    assert page.image.data.startswith(b'\xff\xd8') and page.image.data.endswith(b'\xff\xd9')
+    assert len(page.image.data) < os.path.getsize(path)
+
+
+def test_truncated_jpeg_is_reported(tmp_path):
+    """A truncated JPEG is skipped and reported instead of embedded."""
+    good = str(tmp_path / 'good.jpg')
+    Image.new('RGB', (64, 48), (30, 30, 200)).save(good)
+    bad = str(tmp_path / 'trunc.jpg')
+    with open(good, 'rb') as f:
+        data = f.read()
+    with open(bad, 'wb') as f:
+        f.write(data[:len(data) // 2])
+    
+    report = ExportReport()
+    ok = PDFGenerator.generate_pdf(str(tmp_path / 'out.pdf'),
+                                   [ImageItem(file_path=good), ImageItem(file_path=bad)],
+                                   PageConfig(), report=report, skip_errors=True)
+    
+    assert ok
+    assert [failure.file_path for failure in report.failures] == [bad]
+    assert len(report.pages) == 1
+
+
+def test_passthrough_pages_are_not_cached(tmp_path):
+    """Source JPEGs embedded unchanged are not copied into the render cache."""
+    path = str(tmp_path / 'photo.jpg')
+    Image.new('RGB', (64, 48), (30, 200, 30)).save(path)
+    cache = RenderCache(str(tmp_path / 'cache'))
+    
+    pages = list(PDFGenerator.iter_rendered_pages([ImageItem(file_path=path)], PageConfig(),
+                                                  cache=cache))
+    
+    assert pages[0].image.passthrough
+    assert cache.keys() == set()
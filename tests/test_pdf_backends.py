@@ -0,0 +1,35 @@
+"""
+Tests for the PDF output backends.
+"""
+
+import os
+import sys
+
+import fitz
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import ImageItem, Overlay, PageConfig
+from pdf_backends import BACKENDS
+from pdf_generator import PDFGenerator
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_page_count_leaves_out_skipped_pages(tmp_path, backend):
+    """{pages} counts the pages written, not the ones that failed to render."""
+    good = str(tmp_path / 'good.png')
+    Image.new('RGB', (40, 30), (200, 30, 30)).save(good)
+    bad = str(tmp_path / 'bad.png')
+    with open(bad, 'wb') as f:
+        f.write(b'not an image')
+    output = str(tmp_path / 'out.pdf')
+    config = PageConfig(overlays=[Overlay(text='Page {page} of {pages}')])
+    
+    assert PDFGenerator.generate_pdf(output, [ImageItem(good), ImageItem(bad), ImageItem(good)],
+                                     config, backend=backend, skip_errors=True)
+    
+    with fitz.open(output) as doc:
+        texts = [page.get_text().strip() for page in doc]
+    assert texts == ['Page 1 of 2', 'Page 2 of 2']
@@ -0,0 +1,87 @@
+"""
+Tests for PDF export.
+"""
+
+import os
+import sys
+
+import fitz
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import ExportReport, ImageItem, Overlay, PageConfig
+from pdf_generator import PDFGenerator
+from size_budget import QUALITY_LEVELS
+
+
+def test_failed_target_size_attempt_removes_output(tmp_path, monkeypatch):
+    """A second target-size attempt that fails leaves no file behind."""
+    path = str(tmp_path / 'photo.png')
+    colors = np.random.default_rng(0).integers(0, 255, (12, 16, 3), dtype=np.uint8)
+    Image.fromarray(colors).resize((1200, 900), Image.Resampling.BICUBIC).save(path)
+    output = str(tmp_path / 'out.pdf')
+    
+    write_pdf = PDFGenerator._write_pdf
+    attempts = []
+    
+    def first_attempt_only(*args, **kwargs):
+        # The first attempt overshoots the target, the second one fails
+        attempts.append(args[0])
+        if len(attempts) > 1 or not write_pdf(*args, **kwargs):
+            return False
+        with open(output, 'ab') as f:
+            f.write(b' ' * 100000)
+        return True
+    
+    monkeypatch.setattr(PDFGenerator, '_write_pdf', staticmethod(first_attempt_only))
+    
+    assert not PDFGenerator.generate_pdf(output, [ImageItem(path)], PageConfig(),
+                                         target_size=20000)
+    assert len(attempts) == 2
+    assert not os.path.exists(output)
+
+
+def test_stream_page_count_from_generator(tmp_path):
+    """{pages} is filled in for a streamed export of an iterable without length."""
+    path = str(tmp_path / 'page.png')
+    Image.new('RGB', (40, 30), (30, 30, 200)).save(path)
+    output = str(tmp_path / 'out.pdf')
+    config = PageConfig(overlays=[Overlay(text='Page {page} of {pages}')])
+    
+    with open(output, 'wb') as f:
+        assert PDFGenerator.generate_pdf_stream(f, (ImageItem(path) for _ in range(3)), config)
+    
+    with fitz.open(output) as doc:
+        texts = [page.get_text().strip() for page in doc]
+    assert texts == ['Page 1 of 3', 'Page 2 of 3', 'Page 3 of 3']
+
+
+def test_target_size_refits_until_file_fits(tmp_path, monkeypatch):
+    """Pages are refitted as long as the file is too large and can shrink."""
+    paths = []
+    for index in range(4):
+        path = str(tmp_path / f'photo{index}.png')
+        colors = np.random.default_rng(index).integers(0, 255, (12, 16, 3), dtype=np.uint8)
+        Image.fromarray(colors).resize((1200, 900), Image.Resampling.BICUBIC).save(path)
+        paths.append(path)
+    output = str(tmp_path / 'out.pdf')
+    
+    write_pdf = PDFGenerator._write_pdf
+    
+    def underestimated_overhead(*args, **kwargs):
+        # Every write comes out larger than the size estimate
+        if not write_pdf(*args, **kwargs):
+            return False
+        with open(output, 'ab') as f:
+            f.write(b' ' * 30000)
+        return True
+    
+    monkeypatch.setattr(PDFGenerator, '_write_pdf', staticmethod(underestimated_overhead))
+    report = ExportReport()
+    
+    assert PDFGenerator.generate_pdf(output, [ImageItem(path) for path in paths], PageConfig(),
+                                     target_size=150000, report=report)
+    assert os.path.getsize(output) <= 150000
+    assert max(page.level for page in report.pages) < len(QUALITY_LEVELS) - 1
@@ -0,0 +1,310 @@
+"""
+Region decoding for very large images.
+
+Pillow decodes an image as a whole. For formats whose pixel data is
+stored in independently decodable strips or tiles (uncompressed TIFF,
+BMP, PPM, ...), this module decodes only the strips or tiles that
+intersect a region, so a crop of a gigapixel scan can be rendered band
+by band without ever holding the full bitmap in memory.
+"""
+
+import math
+import threading
+from typing import BinaryIO, List, Optional, Tuple, Union
+from PIL import Image
+
+
+# Rows per virtual strip when a single uncompressed tile is split up
+_RAW_STRIP_BYTES = 1024 * 1024
+
+# Lanczos filter support, in output pixels on each side
+_LANCZOS_SUPPORT = 3
+
+_ORIENTATION_TAG = 274
+
+# Serializes the moments Pillow's pixel count limit is lifted (see open_image)
+_pixel_limit_lock = threading.Lock()
+
+
+def open_image(fp: Union[str, BinaryIO]) -> Image.Image:
+    """
+    Open an image without Pillow's decompression-bomb check.
+    
+    Only for callers that check the decoded size against a memory limit
+    themselves (see check_memory), so large scans that can be read in
+    bands get through. The global limit is lifted just while the header
+    is read, and stays in force for every other Image.open.
+    """
+    with _pixel_limit_lock:
+        max_pixels = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = None
+        try:
+            return Image.open(fp)
+        finally:
+            Image.MAX_IMAGE_PIXELS = max_pixels
+
+
+def decoded_bytes(size: Tuple[int, int], mode: str) -> int:
+    """
+    Estimate the memory needed to decode an image and convert it to RGB.
+    
+    Args:
+        size: Image size in pixels
+        mode: Image mode before conversion
+    
+    Returns:
+        Estimated number of bytes
+    """
+    pixels = size[0] * size[1]
+    # Pillow stores single-band images with one byte per pixel and
+    # everything else, including RGB, with four
+    pixel_bytes = 1 if mode in ('1', 'L', 'P') else 4
+    if mode != 'RGB':
+        pixel_bytes += 4
+    return pixels * pixel_bytes
+
+
+def check_memory(size: Tuple[int, int], mode: str, memory_limit: Optional[int]):
+    """
+    Raise ValueError if decoding an image would exceed the memory limit.
+    
+    Args:
+        size: Image size in pixels
+        mode: Image mode
+        memory_limit: Limit in bytes, or None for no limit
+    """
+    if memory_limit is None:
+        return
+    needed = decoded_bytes(size, mode)
+    if needed > memory_limit:
+        raise ValueError(
+            f"decoding {size[0]}x{size[1]} pixels needs about "
+            f"{needed / (1024 * 1024):.0f} MB, more than the memory limit of "
+            f"{memory_limit / (1024 * 1024):.0f} MB"
+        )
+
+
+def _split_raw_tile(img: Image.Image, tile) -> Optional[List[tuple]]:
+    """Split a single uncompressed tile into strips of whole rows."""
+    codec, extents, offset, args = tile
+    if codec != 'raw' or tuple(extents) != (0, 0) + img.size:
+        return None
+    
+    if isinstance(args, str):
+        args = (args,)
+    rawmode = args[0]
+    stride = args[1] if len(args) > 1 else 0
+    orientation = args[2] if len(args) > 2 else 1
+    if orientation not in (1, -1):
+        return None
+    
+    width, height = img.size
+    if not stride:
+        # Packing one row gives its size in the file
+        try:
+            stride = len(Image.new(img.mode, (width, 1)).tobytes('raw', rawmode))
+        except Exception:
+            return None
+    
+    rows = max(1, _RAW_STRIP_BYTES // stride)
+    strips = []
+    for top in range(0, height, rows):
+        bottom = min(top + rows, height)
+        # Bottom-up images store the last row first
+        first_row = top if orientation == 1 else height - bottom
+        strips.append((codec, (0, top, width, bottom), offset + first_row * stride,
+                       (rawmode, stride, orientation)))
+    return strips
+
+
+def image_tiles(img: Image.Image) -> Optional[List[tuple]]:
+    """
+    Return the independently decodable tiles of an opened image.
+    
+    Args:
+        img: Image returned by Image.open (not yet loaded)
+    
+    Returns:
+        List of (codec, extents, offset, args) tuples, or None if the image
+        can only be decoded as a whole
+    """
+    tiles = getattr(img, 'tile', None)
+    if not tiles or _has_orientation(img):
+        return None
+    if len(tiles) == 1:
+        return _split_raw_tile(img, tiles[0])
+    
+    # TIFF strips and tiles are independent unless libtiff decodes the file
+    if img.format != 'TIFF' or any(tile[0] == 'libtiff' for tile in tiles):
+        return None
+    return [tuple(tile) for tile in tiles]
+
+
+def _has_orientation(img: Image.Image) -> bool:
+    """Check for a TIFF orientation tag, which Pillow applies while loading."""
+    tags = getattr(img, 'tag_v2', None)
+    return tags is not None and tags.get(_ORIENTATION_TAG, 1) != 1
+
+
+def decode_region(file_path: str, frame_index: int, box: Tuple[int, int, int, int],
+                  memory_limit: Optional[int] = None,
+                  mode: str = 'RGB') -> Tuple[Image.Image, Tuple[int, int]]:
+    """
+    Decode the strips or tiles of an image that intersect a box.
+    
+    Args:
+        file_path: Path to the image file
+        frame_index: Frame of a multi-page image
+        box: Pixel box (left, top, right, bottom) that must be covered
+        memory_limit: Limit in bytes for the decoded region, or None
+        mode: Mode of the returned image
+    
+    Returns:
+        Tuple of (image, origin): an image covering at least the box,
+        and the position of its top-left corner in the full image
+    """
+    img = open_image(file_path)
+    try:
+        if frame_index:
+            img.seek(frame_index)
+        tiles = image_tiles(img)
+        if tiles is None:
+            raise ValueError("image cannot be decoded by region")
+        
+        left, top, right, bottom = box
+        selected = [tile for tile in tiles
+                    if tile[1][0] < right and tile[1][2] > left
+                    and tile[1][1] < bottom and tile[1][3] > top]
+        x0 = min(tile[1][0] for tile in selected)
+        y0 = min(tile[1][1] for tile in selected)
+        x1 = max(tile[1][2] for tile in selected)
+        y1 = max(tile[1][3] for tile in selected)
+        check_memory((x1 - x0, y1 - y0), img.mode, memory_limit)
+        
+        # Decode the selected tiles as if they formed the whole image. Newer
+        # Pillow versions expect tiles as named tuples, older ones as tuples
+        make_tile = getattr(type(img.tile[0]), '_make', tuple)
+        img._size = (x1 - x0, y1 - y0)
+        if hasattr(img, '_tile_size'):
+            # TIFF allocates the decode buffer from its own copy of the size
+            img._tile_size = img._size
+        img.tile = [make_tile((codec, (ex0 - x0, ey0 - y0, ex1 - x0, ey1 - y0), offset, args))
+                    for codec, (ex0, ey0, ex1, ey1), offset, args in selected]
+        img.load()
+        region = img.convert(mode) if img.mode != mode else img.copy()
+    finally:
+        img.close()
+    return region, (x0, y0)
+
+
+def _band_rows(memory_limit: int, output_bytes: int, row_width: int) -> int:
+    """
+    Return how many decoded source rows fit in memory next to the output.
+    
+    Strips rarely align with bands, so only half of what is left after
+    the output is planned for; a decoded row costs at most 8 bytes a pixel.
+    
+    Args:
+        memory_limit: Memory ceiling in bytes
+        output_bytes: Memory held by the output image
+        row_width: Width of a decoded source row in pixels
+    """
+    band_budget = (memory_limit - output_bytes) // 2
+    return band_budget // decoded_bytes((row_width, 1), 'RGBA')
+
+
+def _reduce_region(file_path: str, frame_index: int, box: Tuple[int, int, int, int],
+                   factor: int, memory_limit: int, mode: str) -> Image.Image:
+    """Shrink a box of the image by an integer factor, band by band."""
+    left, top, right, bottom = box
+    reduced_size = (math.ceil((right - left) / factor), math.ceil((bottom - top) / factor))
+    check_memory(reduced_size, 'RGB', memory_limit)
+    reduced = Image.new(mode, reduced_size)
+    
+    # Bands are whole multiples of the factor, so the box filter needs no overlap
+    band_rows = (_band_rows(memory_limit, decoded_bytes(reduced_size, 'RGB'), right - left)
+                 // factor * factor)
+    if band_rows < factor:
+        raise ValueError("the memory limit is too low to decode even one band")
+    
+    for band_top in range(top, bottom, band_rows):
+        band_bottom = min(band_top + band_rows, bottom)
+        region, (x0, y0) = decode_region(file_path, frame_index,
+                                         (left, band_top, right, band_bottom),
+                                         memory_limit, mode)
+        band = region.reduce(factor, box=(left - x0, band_top - y0,
+                                          right - x0, band_bottom - y0))
+        del region
+        reduced.paste(band, (0, (band_top - top) // factor))
+    return reduced
+
+
+def resize_region(file_path: str, frame_index: int, image_size: Tuple[int, int],
+                  box: Tuple[int, int, int, int], size: Optional[Tuple[int, int]],
+                  memory_limit: int, reducing_gap: float = 2.0,
+                  mode: str = 'RGB') -> Image.Image:
+    """
+    Crop and resize a large image band by band.
+    
+    Like Image.resize with a reducing gap, large downscales first shrink
+    the crop by an integer factor, which is done one band of source rows
+    at a time, and then apply a single LANCZOS resample. Smaller scale
+    changes resample each band of output rows from just the source rows
+    it depends on, plus the filter support on both sides. Either way the
+    result has no seams.
+    
+    Args:
+        file_path: Path to the image file
+        frame_index: Frame of a multi-page image
+        image_size: Size of the full image in pixels
+        box: Crop box (left, top, right, bottom) in pixels
+        size: Output size, or None to keep the crop at full resolution
+        memory_limit: Memory ceiling in bytes
+        reducing_gap: Integer reduction is only applied while the result
+                      stays this many times larger than the output
+        mode: Mode of the result, 'RGB' or 'L', or 'RGBA' or 'LA' to keep
+              the alpha channel
+    
+    Returns:
+        Image of the cropped region
+    """
+    left, top, right, bottom = box
+    if size is None:
+        region, (x0, y0) = decode_region(file_path, frame_index, box, memory_limit, mode)
+        return region.crop((left - x0, top - y0, right - x0, bottom - y0))
+    
+    width, height = size
+    check_memory(size, 'RGB', memory_limit)
+    scale_x = (right - left) / width
+    scale_y = (bottom - top) / height
+    
+    factor = int(min(scale_x, scale_y) / reducing_gap)
+    if factor > 1:
+        reduced = _reduce_region(file_path, frame_index, box, factor,
+                                 memory_limit - decoded_bytes(size, 'RGB'), mode)
+        return reduced.resize(size, Image.Resampling.LANCZOS,
+                              box=(0, 0, (right - left) / factor, (bottom - top) / factor))
+    
+    output = Image.new(mode, size)
+    pad_x = math.ceil(_LANCZOS_SUPPORT * max(scale_x, 1.0)) + 1
+    pad_y = math.ceil(_LANCZOS_SUPPORT * max(scale_y, 1.0)) + 1
+    
+    band_rows = (_band_rows(memory_limit, decoded_bytes(size, 'RGB'), right - left + 2 * pad_x)
+                 - 2 * pad_y)
+    band_height = int(band_rows / scale_y) if band_rows > 0 else 0
+    if band_height < 1:
+        raise ValueError("the memory limit is too low to decode even one band")
+    
+    for out_top in range(0, height, band_height):
+        out_bottom = min(out_top + band_height, height)
+        src_top = top + out_top * scale_y
+        src_bottom = top + out_bottom * scale_y
+        needed = (max(0, left - pad_x), max(0, math.floor(src_top) - pad_y),
+                  min(image_size[0], right + pad_x),
+                  min(image_size[1], math.ceil(src_bottom) + pad_y))
+        region, (x0, y0) = decode_region(file_path, frame_index, needed, memory_limit, mode)
+        band = region.resize((width, out_bottom - out_top), Image.Resampling.LANCZOS,
+                             box=(left - x0, src_top - y0, right - x0, src_bottom - y0))
+        del region
+        output.paste(band, (0, out_top))
+    return output